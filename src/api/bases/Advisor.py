@@ -0,0 +1,113 @@
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Optional, Any, Literal
+from src.api.bases import Query
+from src.api.bases.Data import Data
+from src.api.bases.IO import DBRequest
+
+
+MIN_ROWS = 10_000  # tables smaller than this are cheaper to scan than to index
+SEQ_RATIO = 0.5  # sequential scans per index scan above which a table is under-indexed
+APPEND_RATIO = 0.01  # updates + deletes per insert below which a table is append-only
+PARTIAL_SHARE = 0.9  # share of a pattern's queries pinned to one literal that earns a partial index
+MAX_INCLUDE = 4  # widest payload worth carrying in a covering index
+
+
+@dataclass(frozen=True)
+class Pattern:
+    schema: str
+    table: str
+    equality: tuple[str, ...]
+    range: tuple[str, ...]
+    order: tuple[str, ...]
+    selected: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class Recommendation:
+    schema: str
+    table: str
+    columns: tuple[str, ...]
+    method: Literal['btree', 'brin'] = 'btree'
+    include: Optional[tuple[str, ...]] = None
+    where: Optional[tuple[tuple[str, str, Any], ...]] = None
+    reason: str = ''
+
+    def request(self, concurrently: bool = True) -> DBRequest:
+        return Query.create_index(
+            table=self.table, columns=self.columns, schema=self.schema, method=self.method,
+            include=self.include, where=self.where, concurrently=concurrently)
+
+
+class QueryLog:
+    """Counts select_values access patterns so the advisor knows which predicates are hot"""
+
+    def __init__(self):
+        self._patterns: Counter[Pattern] = Counter()
+        self._literals: dict[Pattern, Counter[tuple[str, Any]]] = defaultdict(Counter)
+
+    def record(self, request: DBRequest):
+        if not request.access:
+            return
+
+        schema, table, conditions, order = request.access
+        equality = tuple(sorted({name for name, op, _ in conditions if op in ('=', 'IN')}))
+        range_ = tuple(dict.fromkeys(name for name, op, _ in conditions if op not in ('=', 'IN')))
+        selected = tuple(field.name for field in request.returns or ())
+        pattern = Pattern(schema, table, equality, range_, tuple(order), selected)
+
+        self._patterns[pattern] += 1
+        for name, op, val in conditions:
+            if op == '=':
+                self._literals[pattern][(name, val)] += 1
+
+    def patterns(self, schema: str, table: str) -> tuple[tuple[Pattern, int], ...]:
+        return tuple((p, n) for p, n in self._patterns.most_common() if (p.schema, p.table) == (schema, table))
+
+    def literal(self, pattern: Pattern) -> Optional[tuple[str, Any]]:
+        if not (literals := self._literals.get(pattern)):
+            return None
+        (name, val), n = literals.most_common(1)[0]
+        return (name, val) if n >= PARTIAL_SHARE * self._patterns[pattern] else None
+
+
+LOG = QueryLog()
+
+
+def _covered(existing: list[tuple[str, tuple[str, ...]]], method: str, columns: tuple[str, ...]) -> bool:
+    return any(m == method and cols[:len(columns)] == columns for m, cols in existing)
+
+
+def advise(stats: Data, indexes: Data, log: QueryLog = LOG) -> tuple[Recommendation, ...]:
+    existing = defaultdict(list)
+    for schema, table, _, method, columns in indexes.records:
+        existing[(schema, table)].append((method, tuple(columns or ())))
+
+    recommendations = {}
+    for schema, table, seq_scan, seq_tup_read, idx_scan, live, inserted, modified in stats.records:
+        if live < MIN_ROWS or seq_scan <= SEQ_RATIO * idx_scan:
+            continue
+        append_only = modified <= APPEND_RATIO * max(inserted, 1)
+
+        for pattern, count in log.patterns(schema, table):
+            where, equality = None, pattern.equality
+            if literal := log.literal(pattern):
+                where, equality = ((literal[0], '=', literal[1]),), tuple(c for c in equality if c != literal[0])
+
+            if append_only and not equality and pattern.range and not pattern.order[1:]:
+                # append-only time ranges: BRIN summarises block ranges at a fraction of b-tree size
+                rec = Recommendation(schema, table, pattern.range[:1], method='brin', where=where,
+                                     reason=f"{count} range scans on append-only table ({live} rows)")
+            else:
+                columns = tuple(dict.fromkeys((*equality, *pattern.range[:1], *pattern.order)))
+                if not columns:
+                    continue
+                payload = tuple(c for c in pattern.selected if c not in columns and c != (literal or ('',))[0])
+                include = payload if 0 < len(payload) <= MAX_INCLUDE else None
+                rec = Recommendation(schema, table, columns, include=include, where=where,
+                                     reason=f"{count} scans filtering {columns} ({seq_scan} seq / {idx_scan} idx)")
+
+            if not _covered(existing[(schema, table)], rec.method, rec.columns):
+                recommendations.setdefault((schema, table, rec.method, rec.columns), rec)
+
+    return tuple(recommendations.values())
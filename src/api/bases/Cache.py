@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import zlib
+import asyncio
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional
+from src import config
+from src.api.bases import Logger
+from src.api.bases.IO import HTTPPool, HTTPRequest, HTTPResponse
+
+
+ROOT = Path(config.PROJECT_ENV['SERVER_ROOT']) / 'http_cache'
+CAPACITY = 256 * 2 ** 20  # bytes of compressed bodies kept on disk
+LOGGER = Logger.logger()
+
+
+def _write(path: Path, content: bytes):
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    tmp.write_bytes(content)
+    os.replace(tmp, path)
+
+
+class Cache:
+    """Responses on disk keyed by request fingerprint: `<key>.json` holds status, headers and validators, `<key>.z`
+    the compressed body. The LRU order is rebuilt from file mtimes, so a restart keeps what was cached"""
+
+    def __init__(self, root: Path = ROOT, capacity: int = CAPACITY):
+        self._root = root
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._lru: OrderedDict[str, int] = OrderedDict()
+        for body in sorted(self._root.glob('*.z'), key=lambda p: p.stat().st_mtime):
+            self._lru[body.stem] = body.stat().st_size
+        self._size = sum(self._lru.values())
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self):
+        return len(self._lru)
+
+    def get(self, key: str) -> Optional[tuple[dict, HTTPResponse]]:
+        try:
+            meta = json.loads((self._root / f'{key}.json').read_bytes())
+            body = zlib.decompress((self._root / f'{key}.z').read_bytes())
+        except (FileNotFoundError, zlib.error, ValueError):
+            return None
+        self.touch(key)
+        return meta, HTTPResponse(meta['status'], meta['headers'], body, meta.get('reason', ''))
+
+    def touch(self, key: str, stored: Optional[float] = None):
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+        try:
+            os.utime(self._root / f'{key}.z')
+        except FileNotFoundError:
+            return  # evicted meanwhile
+        if stored is not None:
+            path = self._root / f'{key}.json'
+            meta = json.loads(path.read_bytes())
+            _write(path, json.dumps(meta | {'stored': stored}).encode())
+
+    def put(self, key: str, request: HTTPRequest, response: HTTPResponse):
+        body = zlib.compress(response.body)
+        meta = {
+            'url': request.url, 'status': response.status, 'reason': response.reason, 'headers': response.headers,
+            'stored': time.time(),
+        }
+        _write(self._root / f'{key}.z', body)
+        _write(self._root / f'{key}.json', json.dumps(meta, default=str).encode())
+        with self._lock:
+            self._size += len(body) - self._lru.get(key, 0)
+            self._lru[key] = len(body)
+            self._lru.move_to_end(key)
+            evicted = []
+            while self._size > self._capacity and len(self._lru) > 1:
+                old, size = self._lru.popitem(last=False)
+                self._size -= size
+                evicted.append(old)
+        for old in evicted:
+            for suffix in ('.z', '.json'):
+                (self._root / f'{old}{suffix}').unlink(missing_ok=True)
+
+
+def _validators(headers: dict) -> dict:
+    headers = {k.lower(): v for k, v in headers.items()}
+    conditional = {}
+    if etag := headers.get('etag'):
+        conditional['If-None-Match'] = etag
+    if modified := headers.get('last-modified'):
+        conditional['If-Modified-Since'] = modified
+    return conditional
+
+
+class CachedPool(HTTPPool):
+    """Serves requests stamped with a ttl from the disk cache while fresh. Once stale, an entry is revalidated with
+    ETag/Last-Modified when the vendor sent them (a 304 renews it) and refetched otherwise. Unstamped requests, and
+    anything but a 200, pass straight through"""
+
+    def __init__(self, inner: HTTPPool, cache: Optional[Cache] = None):
+        self._inner = inner
+        self._cache = cache if cache is not None else Cache()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def alive(self) -> bool:
+        return self._inner.alive
+
+    @property
+    def cache(self) -> Cache:
+        return self._cache
+
+    async def close(self):
+        await self._inner.close()
+
+    async def send(self, request: HTTPRequest) -> HTTPResponse:
+        if request.ttl is None or request.meth != 'GET':
+            return await self._inner.send(request)
+        key = request.fingerprint
+        # identical misses in flight share one vendor round trip
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        self._inflight[key] = asyncio.ensure_future(self._send(key, request))
+        try:
+            return await asyncio.shield(self._inflight[key])
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _send(self, key: str, request: HTTPRequest) -> HTTPResponse:
+        cached = await asyncio.to_thread(self._cache.get, key)
+        if cached:
+            meta, response = cached
+            if time.time() - meta['stored'] < request.ttl.total_seconds():
+                return response
+            if conditional := _validators(meta['headers']):
+                fresh = await self._inner.send(
+                    HTTPRequest(request.meth, request.url, (request.headers or {}) | conditional, request.params))
+                if fresh.status == 304:
+                    await asyncio.to_thread(self._cache.touch, key, time.time())
+                    return response
+            else:
+                fresh = await self._inner.send(request)
+        else:
+            fresh = await self._inner.send(request)
+        if fresh.status == 200:
+            try:
+                await asyncio.to_thread(self._cache.put, key, request, fresh)
+            except OSError as e:
+                LOGGER.warning(f'http cache: could not store {request.url}: {e}')
+        return fresh
@@ -0,0 +1,99 @@
+from typing import Optional
+from src.api.bases.Data import Data, Field
+from src.api.bases.Database import Database, Schema, Table, Column
+
+
+CHANNEL = '_meta_catalog'
+FIELDS = (
+    Field('column', str),
+    Field('type', str),
+    Field('default', str),
+    Field('database', str),
+    Field('schema', str),
+    Field('table', str),
+)
+
+
+class Catalog:
+    """In-process cache of database -> schema -> table -> columns, keyed for O(1) lookups"""
+
+    def __init__(self):
+        self._databases: dict[str, Database] = {}
+        self._schemas: dict[str, dict[str, Schema]] = {}
+        self._tables: dict[tuple[str, str], dict[str, Table]] = {}
+        self._columns: dict[tuple[str, str, str], dict[str, Column]] = {}
+        self._loaded = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def _add(self, column: str, dtype: str, default: str, database: str, schema: str, table: str):
+        if not (db := self._databases.get(database)):
+            db = self._databases[database] = Database(database)
+            self._schemas[database] = {}
+
+        if not (sch := self._schemas[database].get(schema)):
+            sch = self._schemas[database][schema] = Schema(db, schema)
+            self._tables[(database, schema)] = {}
+
+        if not (tbl := self._tables[(database, schema)].get(table)):
+            tbl = self._tables[(database, schema)][table] = Table(sch, table)
+            self._columns[(database, schema, table)] = {}
+
+        self._columns[(database, schema, table)][column] = Column(tbl, column, dtype, default)
+
+    def clear(self):
+        self._databases.clear()
+        self._schemas.clear()
+        self._tables.clear()
+        self._columns.clear()
+        self._loaded = False
+
+    def load(self, data: Data):
+        self.clear()
+        for record in data.records:
+            self._add(*record)
+        self._loaded = True
+
+    def refresh(self, database: str, schema: str, table: str, data: Data):
+        self.drop(database, schema, table)
+        for record in data.records:
+            self._add(*record)
+
+    def drop(self, database: str, schema: str, table: Optional[str] = None):
+        if table is None:
+            for tbl in self._tables.pop((database, schema), {}):
+                self._columns.pop((database, schema, tbl), None)
+            self._schemas.get(database, {}).pop(schema, None)
+            return
+
+        self._columns.pop((database, schema, table), None)
+        if (tables := self._tables.get((database, schema))) is not None:
+            tables.pop(table, None)
+            if not tables:
+                self.drop(database, schema)
+
+    def databases(self) -> tuple[Database, ...]:
+        return tuple(self._databases.values())
+
+    def schemas(self, database: str) -> tuple[Schema, ...]:
+        return tuple(self._schemas.get(database, {}).values())
+
+    def tables(self, database: str, schema: str) -> tuple[Table, ...]:
+        return tuple(self._tables.get((database, schema), {}).values())
+
+    def columns(self, database: str, schema: str, table: str) -> tuple[Column, ...]:
+        return tuple(self._columns.get((database, schema, table), {}).values())
+
+    def column(self, database: str, schema: str, table: str, column: str) -> Optional[Column]:
+        return self._columns.get((database, schema, table), {}).get(column)
+
+    @property
+    def snapshot(self) -> Data:
+        records = tuple(
+            (col.name, col.dtype, col.default, database, schema, table)
+            for (database, schema, table), columns in self._columns.items()
+            for col in columns.values()
+        )
+        return Data(fields=FIELDS, records=records)
@@ -0,0 +1,80 @@
+from bisect import bisect_left, bisect_right
+from typing import Optional
+from pandas import Timestamp
+from src.api.bases.Data import Data
+
+
+class IntervalSet:
+    """Disjoint, sorted half-open [start, end) intervals; touching or overlapping inserts are merged"""
+
+    def __init__(self):
+        self._starts: list[Timestamp] = []
+        self._ends: list[Timestamp] = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        return zip(self._starts, self._ends)
+
+    def add(self, start: Timestamp, end: Timestamp):
+        if not start < end:
+            return
+        i = bisect_left(self._ends, start)
+        j = bisect_right(self._starts, end)
+        if i < j:
+            start, end = min(start, self._starts[i]), max(end, self._ends[j - 1])
+        self._starts[i:j] = [start]
+        self._ends[i:j] = [end]
+
+    def missing(self, start: Timestamp, end: Timestamp) -> tuple[tuple[Timestamp, Timestamp], ...]:
+        gaps, cursor = [], start
+        i = bisect_right(self._ends, start)
+        while i < len(self._starts) and self._starts[i] < end:
+            if self._starts[i] > cursor:
+                gaps.append((cursor, self._starts[i]))
+            cursor = max(cursor, self._ends[i])
+            i += 1
+        if cursor < end:
+            gaps.append((cursor, end))
+        return tuple(gaps)
+
+    def covered(self, start: Timestamp, end: Timestamp) -> bool:
+        return not self.missing(start, end)
+
+
+class Coverage:
+    def __init__(self):
+        self._index: dict[tuple[str, str, str], IntervalSet] = {}
+        self._loaded = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, data: Data):
+        # merges into what is already indexed, so ranges ingested before the first load survive
+        for vendor, symbol, field, start, end in data.records:
+            self.add(vendor, symbol, field, Timestamp(start), Timestamp(end))
+        self._loaded = True
+
+    def add(self, vendor: str, symbol: str, field: str, start: Timestamp, end: Timestamp):
+        self._index.setdefault((vendor, symbol, field), IntervalSet()).add(start, end)
+
+    def items(self):
+        return self._index.items()
+
+    def get(self, vendor: str, symbol: str, field: str) -> Optional[IntervalSet]:
+        return self._index.get((vendor, symbol, field))
+
+    def missing(
+            self,
+            vendor: str,
+            symbol: str,
+            field: str,
+            start: Timestamp,
+            end: Timestamp
+    ) -> tuple[tuple[Timestamp, Timestamp], ...]:
+        if (intervals := self.get(vendor, symbol, field)) is None:
+            return ((start, end),) if start < end else ()
+        return intervals.missing(start, end)
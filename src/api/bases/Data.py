@@ -80,9 +80,22 @@ class Data:
     def __init__(self, fields: Sequence[Field], records: Sequence[Sequence]):
         self._fields: tuple[Field, ...] = tuple(fields)
         self._records: tuple[tuple[Any, ...], ...] = self._ingest(fields, records)
-        self._size: float = reduce(
-            lambda x, y: x + y, (sum(getsizeof(val) for val in tup) for tup in records),
-        ) if records else 0
+        self._size: Optional[float] = None  # a getsizeof per cell; only paid when someone asks
+
+    @classmethod
+    def from_columns(cls, fields: Sequence[Field], columns: Sequence[Sequence]) -> 'Data':
+        if len(columns) != len(fields) or len({len(column) for column in columns}) > 1:
+            raise ValueError("All columns must have the same length, one per field")
+        # equal-length columns zip into uniform rows, so the per-row checks in _ingest are skipped
+        data = cls.__new__(cls)
+        data._fields, data._records, data._size = tuple(fields), tuple(zip(*columns)), None
+        return data
+
+    @classmethod
+    def concat(cls, parts: Sequence['Data']) -> 'Data':
+        if not parts:
+            return cls(fields=(), records=())
+        return cls(fields=parts[0].fields, records=tuple(rec for part in parts for rec in part.records))
 
     @staticmethod
     def _ingest(fields, records) -> tuple[tuple[Any, ...], ...] | None:
@@ -120,10 +133,14 @@ class Data:
         # let pandas handle Timestamps internally
 
     def __sizeof__(self):
+        if self._size is None:
+            self._size = reduce(
+                lambda x, y: x + y, (sum(getsizeof(val) for val in tup) for tup in self._records),
+            ) if self._records else 0
         return self._size
 
     def __str__(self):
-        return f"Data: ({self.dims[0]} x {self.dims[1]}) [{round(self._size / 1e6, 2)}MB]"
+        return f"Data: ({self.dims[0]} x {self.dims[1]}) [{round(self.__sizeof__() / 1e6, 2)}MB]"
 
     def __repr__(self):
         return self.__str__()
@@ -0,0 +1,186 @@
+import asyncio
+from dataclasses import dataclass, replace
+from typing import Optional, Callable, Awaitable, Sequence, Literal, Any
+from pandas import Timestamp, Timedelta
+from src.api.bases.Data import Data, Field
+from src.api.bases.Coverage import Coverage
+from src.api.bases.Vendor import Capability
+
+
+DEFAULT_LIMIT = 8
+LIMITS = {'td': 8, 'fred': 4, 'worldbank': 4, 'figi': 2}  # concurrent calls in flight per vendor
+Orientation = Literal['wide', 'long']
+
+
+@dataclass(frozen=True)
+class Call:
+    vendor: str
+    endpoint: str
+    symbol: Optional[str | tuple[str, ...]] = None
+    fields: Optional[tuple[str, ...]] = None
+    start: Optional[Timestamp] = None
+    end: Optional[Timestamp] = None
+    resolution: Optional[Timedelta] = None
+
+    @property
+    def symbols(self) -> tuple[Optional[str], ...]:
+        return self.symbol if isinstance(self.symbol, tuple) else (self.symbol,)
+
+
+@dataclass
+class Progress:
+    total: int
+    done: int = 0
+    failed: int = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.done + self.failed == self.total
+
+
+@dataclass
+class Report:
+    data: Data
+    results: tuple[tuple[Call, Data], ...]
+    failures: tuple[tuple[Call, Exception], ...]
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+
+def _windows(
+        start: Optional[Timestamp],
+        end: Optional[Timestamp],
+        span: Optional[Timedelta]
+) -> tuple[tuple[Optional[Timestamp], Optional[Timestamp]], ...]:
+    # cut on a fixed grid from the epoch, so reruns issue the same windows and hit the same cache entries
+    if span is None or start is None or end is None or not start < end:
+        return ((start, end),)
+    epoch = Timestamp(0, tz=start.tz)
+    edge = epoch + (start - epoch) // span * span
+    windows = []
+    while edge < end:
+        windows.append((max(edge, start), min(edge + span, end)))
+        edge += span
+    return tuple(windows)
+
+
+def _covered(call: Call, coverage: Coverage) -> bool:
+    if call.fields is None or call.start is None or call.end is None:
+        return False
+    return all(not coverage.missing(call.vendor, symbol, field, call.start, call.end)
+               for symbol in call.symbols for field in call.fields)
+
+
+def _ns(ts) -> int:
+    # epoch nanoseconds (UTC for tz-aware stamps), so naive and aware bounds sort together
+    return Timestamp(ts).value if ts is not None else 0
+
+
+def batch(
+        calls: Sequence[Call],
+        capability: Callable[[str, str], Capability],
+        coverage: Optional[Coverage] = None
+) -> tuple[Call, ...]:
+    """Turns per-symbol calls into the fewest calls each endpoint allows: ranges are cut into the endpoint's widest
+    window, symbols sharing an endpoint, fields, window and resolution are packed together, and windows that
+    `coverage` already holds are dropped"""
+    groups: dict[tuple, list[str]] = {}
+    out = []
+    for call in calls:
+        cap = capability(call.vendor, call.endpoint)
+        if not cap.serves(call.resolution):
+            raise ValueError(f"{call.vendor}.{call.endpoint} does not serve {call.resolution} resolution")
+        for start, end in _windows(call.start, call.end, cap.window(call.resolution)):
+            part = replace(call, start=start, end=end)
+            if coverage is not None and _covered(part, coverage):
+                continue
+            if cap.symbols > 1 and part.symbol is not None:
+                key = (call.vendor, call.endpoint, call.fields, start, end, call.resolution)
+                groups.setdefault(key, []).extend(part.symbols)
+            else:
+                out.append(part)
+
+    for (vendor, endpoint, fields, start, end, resolution), symbols in groups.items():
+        size, symbols = capability(vendor, endpoint).symbols, list(dict.fromkeys(symbols))
+        out.extend(Call(vendor, endpoint, tuple(symbols[i:i + size]), fields, start, end, resolution)
+                   for i in range(0, len(symbols), size))
+
+    # one endpoint and symbol at a time, oldest window first: coverage extends contiguously and
+    # consecutive calls revisit the same cached reference data
+    return tuple(sorted(out, key=lambda c: (
+        c.vendor, c.endpoint, tuple(s or '' for s in c.symbols),
+        c.start is not None, _ns(c.start), c.end is None, _ns(c.end))))
+
+
+async def execute(
+        calls: Sequence[Call],
+        fetch: Callable[[Call], Awaitable[Data]],
+        limits: Optional[dict[str, int]] = None,
+        progress: Optional[Callable[[Progress], Any]] = None
+) -> tuple[tuple[tuple[Call, Data], ...], tuple[tuple[Call, Exception], ...]]:
+    # every call is in flight at once, bounded only by its vendor's semaphore
+    limits = LIMITS if limits is None else limits
+    semaphores = {vendor: asyncio.Semaphore(limits.get(vendor, DEFAULT_LIMIT)) for vendor in {c.vendor for c in calls}}
+    state = Progress(total=len(calls))
+
+    async def _one(call: Call) -> Data | Exception:
+        async with semaphores[call.vendor]:
+            try:
+                res = await fetch(call)
+                state.done += 1
+            except Exception as e:
+                res = e
+                state.failed += 1
+        if progress:
+            progress(state)
+        return res
+
+    outcomes = await asyncio.gather(*map(_one, calls))
+    results = tuple((c, res) for c, res in zip(calls, outcomes) if not isinstance(res, Exception))
+    failures = tuple((c, res) for c, res in zip(calls, outcomes) if isinstance(res, Exception))
+    return results, failures
+
+
+def _time_field(data: Data) -> Optional[str]:
+    return next((field.name for field in data.fields if field.dtype is Timestamp), None)
+
+
+def _dtype(dtypes: set) -> type:
+    if len(dtypes) == 1:
+        return next(iter(dtypes))
+    return float if dtypes <= {int, float} else str
+
+
+def assemble(results: Sequence[tuple[Call, Data]], orientation: Orientation = 'wide') -> Data:
+    cells, dtypes = [], {}
+    for call, data in results:
+        time_field = _time_field(data)
+        names = [field.name for field in data.fields]
+        t = names.index(time_field) if time_field else None
+        s = names.index('symbol') if 'symbol' in names else None  # batched calls carry it per row
+        values = tuple((i, field) for i, field in enumerate(data.fields) if field.name not in ('symbol', time_field))
+        for rec in data.records:
+            symbol = rec[s] if s is not None else call.symbol
+            for i, field in values:
+                cells.append((call.vendor, symbol, field.name, rec[t] if t is not None else None, rec[i]))
+                dtypes.setdefault(f'{symbol}.{field.name}', set()).add(field.dtype)
+
+    if orientation == 'long':
+        dtype = _dtype(set().union(*dtypes.values()) if dtypes else {float})
+        fields = (Field('vendor', str), Field('symbol', str), Field('field', str), Field('time', Timestamp),
+                  Field('value', dtype))
+        return Data(fields=fields, records=cells)
+
+    # wide: one row per timestamp, one column per symbol.field, outer-joined
+    rows: dict[Optional[Timestamp], dict[str, Any]] = {}
+    for _, symbol, name, t, value in cells:
+        rows.setdefault(t, {})[f'{symbol}.{name}'] = value
+    columns = tuple(dtypes)
+    fields = (Field('time', Timestamp), *(Field(col, _dtype(dtypes[col])) for col in columns))
+    records = tuple(
+        (t, *(row.get(col) for col in columns))
+        for t, row in sorted(rows.items(), key=lambda item: (item[0] is None, item[0]))
+    )
+    return Data(fields=fields, records=records)
@@ -0,0 +1,148 @@
+from keyword import iskeyword
+from operator import itemgetter, attrgetter
+from dataclasses import dataclass, field as _field
+from typing import Optional, Callable, Sequence, Any
+from pandas import to_datetime, to_numeric
+from src.api.bases import Json
+from src.api.bases.Data import Data, Field, PY_TYPE
+from src.api.bases.IO import HTTPResponse
+
+
+WILDCARD = '*'
+Path = tuple[str | int, ...]
+WIRE_TYPES = {float: float, str: str, bool: bool}  # anything else (ints sent as floats, epochs, ...) decodes as-is
+
+
+"""
+COLUMN CONVERTERS (applied once per column, never per cell)
+"""
+
+
+def epoch_ms(column: Sequence) -> Sequence:
+    return to_datetime(column, unit='ms')
+
+
+def timestamp(column: Sequence) -> Sequence:
+    # mixed offsets ('2013-07-31 09:26:16-05') normalise to naive UTC; unparseable cells become NaT
+    return to_datetime(column, errors='coerce', utc=True, format='mixed').tz_convert(None)
+
+
+def number(column: Sequence) -> Sequence:
+    # FRED marks missing observations with '.'
+    return to_numeric(column, errors='coerce').tolist()
+
+
+"""
+SPECS
+"""
+
+
+@dataclass(frozen=True)
+class Spec:
+    name: str
+    dtype: PY_TYPE
+    path: Optional[Path] = None
+    convert: Optional[Callable[[Sequence], Sequence]] = None
+
+    @property
+    def key(self) -> Path:
+        return self.path or (self.name,)
+
+
+def _get(obj: Any, path: Path) -> Any:
+    for key in path:
+        if isinstance(obj, dict):
+            obj = obj.get(key)
+        elif isinstance(obj, list) and isinstance(key, int) and -len(obj) <= key < len(obj):
+            obj = obj[key]
+        else:
+            return None
+    return obj
+
+
+def _walk(obj: Any, path: Path) -> list:
+    # '*' fans out over a dict's values or a list's items; every other step is a key or index
+    objs = [obj]
+    for key in path:
+        if key == WILDCARD:
+            objs = [v for o in objs for v in (o.values() if isinstance(o, dict) else o or ())]
+        else:
+            objs = [v for o in objs if (v := _get(o, (key,))) is not None]
+    return objs
+
+
+def _identifier(key: Any) -> bool:
+    return isinstance(key, str) and key.isidentifier() and not iskeyword(key)
+
+
+def _shape(specs: tuple[Spec, ...], rows: Path) -> Optional[type]:
+    # typed decoding covers flat records under a chain of keys: ('candles', '*') -> {candles: [Row, ...]}
+    if not rows or rows[-1] != WILDCARD or not all(map(_identifier, rows[:-1])):
+        return None
+    if not all(len(spec.key) == 1 and _identifier(spec.key[0]) for spec in specs):
+        return None
+    shape = Json.struct('Row', tuple(
+        (spec.key[0], Any if spec.convert else WIRE_TYPES.get(spec.dtype, Any)) for spec in specs
+    ))
+    if shape is None:
+        return None
+    shape = list[shape] if rows[:-1] else dict[str, shape]
+    for key in reversed(rows[:-1]):
+        shape = Json.struct(key.capitalize(), ((key, shape),))
+    return shape
+
+
+@dataclass(frozen=True)
+class Extractor:
+    """Compiles field specs into a columnar extractor over the records found at `rows`"""
+    specs: tuple[Spec, ...]
+    rows: Path = ()
+    typed: bool = False  # decode straight into structs when msgspec is installed; for large, regular shapes
+    fields: tuple[Field, ...] = _field(init=False)
+    decoder: Json.Decoder = _field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'fields', tuple(Field(spec.name, spec.dtype) for spec in self.specs))
+        shape = _shape(self.specs, self.rows) if self.typed else None
+        object.__setattr__(self, 'decoder', Json.Decoder(shape) if shape is not None else Json.DEFAULT)
+
+    def records(self, payload: Any) -> list:
+        if not self.rows:
+            return payload
+        if self.decoder.typed and not isinstance(payload, dict):
+            for key in self.rows[:-1]:
+                payload = getattr(payload, key) or ()
+            return payload
+        return _walk(payload, self.rows)
+
+    def columns(self, records: Sequence) -> list:
+        keys = tuple(spec.key for spec in self.specs)
+        if records and Json.is_struct(records[0]):
+            # structs carry every declared field, so attribute access never misses
+            return list(zip(*map(attrgetter(*(key for key, in keys)), records))) if len(keys) > 1 \
+                else [[getattr(record, keys[0][0]) for record in records]]
+        if len(keys) > 1 and all(len(key) == 1 for key in keys):
+            # flat records: transpose in C; a record missing any key falls back to the tolerant path
+            try:
+                return list(zip(*map(itemgetter(*(key for key, in keys)), records))) or [()] * len(keys)
+            except (KeyError, TypeError):
+                pass
+        return [[_get(record, key) for record in records] for key in keys]
+
+    def parse(self, res: Any, **constants) -> Data:
+        # HTTPResponse caches its decode per decoder; a plain requests.Response is decoded here, once
+        if isinstance(res, HTTPResponse):
+            return self(res.json(self.decoder), **constants)
+        return self(self.decoder.decode(res.content), **constants)
+
+    def __call__(self, payload: Any, **constants) -> Data:
+        # constants (e.g. the symbol a request was made for) are prepended as columns
+        columns = self.columns(self.records(payload))
+        for i, spec in enumerate(self.specs):
+            if spec.convert:
+                columns[i] = spec.convert(columns[i])
+        if not constants:
+            return Data.from_columns(self.fields, columns)
+        n = len(columns[0]) if columns else 0
+        fields = (*(Field(name, type(value)) for name, value in constants.items()), *self.fields)
+        return Data.from_columns(fields, [*([value] * n for value in constants.values()), *columns])
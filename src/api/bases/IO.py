@@ -1,16 +1,23 @@
 import sys
+import json
+import yarl
 import asyncio
+import hashlib
+from http import HTTPStatus
 from concurrent.futures.thread import ThreadPoolExecutor
 import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
 import threading
 import psycopg
 import psycopg_pool
 import queue
-from pandas import Timestamp
-from typing import Optional, Type, Literal
+import heapq
+from itertools import chain
+from pandas import Timestamp, Timedelta
+from typing import Optional, Type, Literal, Callable, Awaitable, Sequence, Any
 from dataclasses import dataclass
 from contextlib import asynccontextmanager, AbstractAsyncContextManager
-from src.api.bases import Data, Logger
+from src.api.bases import Data, Logger, Json
 from src import config
 
 
@@ -53,8 +60,10 @@ class Controller(object):
 @dataclass
 class DBRequest:
     body: psycopg.sql.SQL | psycopg.sql.Composed | str
-    values: Optional[tuple | tuple[tuple]] = None
+    values: Optional[tuple | tuple[tuple] | dict] = None
     returns: Optional[tuple[Data.Field, ...] | tuple[tuple[str, Type], ...]] = None
+    autocommit: bool = False
+    access: Optional[tuple[str, str, tuple[tuple[str, str, Any], ...], tuple[str, ...]]] = None
 
     def __post_init__(self):
         if not isinstance(self.body, psycopg.sql.SQL | psycopg.sql.Composed):
@@ -78,21 +87,77 @@ class CopyDBRequest(DBRequest):
     def to_cursor(self) -> psycopg.sql.SQL: return self.body
 
 
+SECRETS = frozenset({'authorization', 'x-openfigi-apikey', 'api_key', 'apikey', 'refresh_token', 'client_id'})
+
+
 @dataclass
 class HTTPRequest:
     meth: Literal['GET', 'POST', 'PUT'] = 'GET'
     url: str = "http://httpbin.org/get"
     headers: Optional[dict] = None
     params: Optional[dict] = None
+    json: Optional[Any] = None
+    data: Optional[dict] = None  # form-encoded body
+    ttl: Optional[Timedelta] = None  # how long a response may be served from the disk cache; not part of the key
 
     @property
     def to_session(self) -> dict:
-        return {
+        params = {k: str(v).lower() if isinstance(v, bool) else v for k, v in self.params.items()} \
+            if self.params else None
+        session = {
             'method': self.meth.lower(),
             'url': self.url,
             'headers': self.headers,
-            'params': self.params
+            'params': params
         }
+        if self.data is not None:
+            session['data'] = self.data
+        if self.json is not None:
+            session['data'] = Json.dumps(self.json)
+            session['headers'] = {'Content-Type': 'application/json'} | (self.headers or {})
+        return session
+
+    @property
+    def fingerprint(self) -> str:
+        # method, url, sorted params and body; credentials are left out so keys survive token rotation
+        def _clean(d: Optional[dict]) -> list:
+            return sorted(
+                (k, str(v).lower() if isinstance(v, bool) else str(v)) for k, v in (d or {}).items()
+                if k.lower() not in SECRETS)
+
+        key = (self.meth.upper(), self.url, _clean(self.headers), _clean(self.params), _clean(self.data), self.json)
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _phrase(status: int) -> str:
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ''
+
+
+@dataclass
+class HTTPResponse:
+    status: int
+    headers: dict
+    body: bytes
+    reason: str = ''
+
+    def json(self, decoder: Json.Decoder = Json.DEFAULT) -> Any:
+        # each body is decoded at most once per decoder, however many formatters read it
+        if not hasattr(self, '_json'):
+            self._json = {}
+        if decoder not in self._json:
+            self._json[decoder] = decoder.decode(self.body)
+        return self._json[decoder]
+
+    def raise_for_status(self, request: HTTPRequest):
+        # the same error aiohttp raises, so retry and re-auth logic cannot tell live from replayed traffic
+        if self.status >= 400:
+            url = yarl.URL(request.url)
+            info = aiohttp.RequestInfo(url, request.meth, CIMultiDictProxy(CIMultiDict()), url)
+            raise aiohttp.ClientResponseError(
+                info, (), status=self.status, message=self.reason or _phrase(self.status), headers=self.headers)
 
 
 @dataclass
@@ -106,14 +171,18 @@ class Result:
 class DBPool(AbstractAsyncContextManager):
     _pool: psycopg_pool.AsyncConnectionPool = None
 
-    def __init__(self, conn_info: dict):
+    def __init__(self, conn_info: dict, **kwargs):
         conn_info = psycopg.conninfo.make_conninfo(**conn_info)
-        self._pool = psycopg_pool.AsyncConnectionPool(conninfo=conn_info, open=False)
+        self._pool = psycopg_pool.AsyncConnectionPool(conninfo=conn_info, open=False, **kwargs)
 
     @property
     def alive(self) -> bool:
         return not self._pool.closed
 
+    @property
+    def size(self) -> int:
+        return self._pool.max_size
+
     async def __aenter__(self):
         if self._pool:
             if self._pool.closed:
@@ -122,27 +191,93 @@ class DBPool(AbstractAsyncContextManager):
         raise ConnectionError("Connection pool lost")
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self._pool.__aexit__(exc_type, exc_val, exc_tb)
+        # the pool outlives each transaction; concurrent callers share it until close()
+        return None
+
+    async def close(self):
+        await self._pool.close()
 
     @asynccontextmanager
     async def connection(self):
         async with self._pool.connection() as conn:
             yield conn
 
+    async def listen(self, request: DBRequest, callback: Callable[[psycopg.Notify], Awaitable]) -> asyncio.Task:
+        # LISTEN on a dedicated autocommit connection so the subscription never holds a pooled slot
+        conn = await psycopg.AsyncConnection.connect(self._pool.conninfo, autocommit=True)
+        await conn.execute(**request.to_cursor)
+
+        async def _listen():
+            async with conn:
+                async for notify in conn.notifies():
+                    await callback(notify)
+
+        return asyncio.create_task(_listen())
+
 
 async def db_transaction(pool: DBPool, request: DBRequest) -> Result:
+    async with pool as pool:
+        async with pool.connection() as conn:
+            if request.autocommit:
+                await conn.set_autocommit(True)
+            try:
+                async with conn.cursor() as cur:
+                    await cur.execute(**request.to_cursor)
+                    if request.returns:
+                        res = await cur.fetchall()
+                        res = Data.Data(fields=request.returns, records=res)
+                    else:
+                        res = None
+            finally:
+                if request.autocommit:
+                    await conn.set_autocommit(False)
+    return Result(res)
+
+
+async def db_script(pool: DBPool, requests: Sequence[DBRequest]) -> Result:
+    res = None
     async with pool as pool:
         async with pool.connection() as conn:
             async with conn.cursor() as cur:
-                await cur.execute(**request.to_cursor)
-                if request.returns:
-                    res = await cur.fetchall()
-                    res = Data.Data(fields=request.returns, records=res)
-                else:
-                    res = None
+                for request in requests:
+                    if isinstance(request, CopyDBRequest):
+                        async with cur.copy(request.to_cursor) as copy:
+                            for row in request.values:
+                                await copy.write_row(row)
+                    else:
+                        await cur.execute(**request.to_cursor)
+                        if request.returns:
+                            res = Data.Data(fields=request.returns, records=await cur.fetchall())
     return Result(res)
 
 
+async def db_parallel(
+        pool: DBPool,
+        requests: Sequence[DBRequest],
+        parallelism: Optional[int] = None,
+        key: Optional[str] = None
+) -> Result:
+    semaphore = asyncio.Semaphore(min(parallelism or pool.size, pool.size))
+
+    async def _one(request: DBRequest) -> Result:
+        async with semaphore:
+            return await db_transaction(pool, request)
+
+    # splits without a result set (no returns) contribute nothing to the merge
+    results = [res.content for res in await asyncio.gather(*map(_one, requests)) if res.content is not None]
+    if not results:
+        fields = next((request.returns for request in requests if request.returns), ())
+        return Result(Data.Data(fields=fields, records=()))
+
+    fields = results[0].fields
+    if key:
+        ix = [field.name for field in fields].index(key)
+        records = heapq.merge(*(res.records for res in results), key=lambda rec: (rec[ix] is None, rec[ix]))
+    else:
+        records = chain.from_iterable(res.records for res in results)
+    return Result(Data.Data(fields=fields, records=tuple(records)))
+
+
 class HTTPPool(AbstractAsyncContextManager):
     _pool: aiohttp.ClientSession = None
 
@@ -171,10 +306,26 @@ class HTTPPool(AbstractAsyncContextManager):
         raise ConnectionError("Connection pool lost")
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self._pool.__aexit__(exc_type, exc_val, exc_tb)
+        # the session outlives each request; concurrent callers share it until close()
+        return None
+
+    async def close(self):
+        await self._pool.close()
+
+    async def send(self, request: HTTPRequest) -> HTTPResponse:
+        async with self as session:
+            async with session.request(**request.to_session) as response:
+                return HTTPResponse(
+                    response.status, dict(response.headers), await response.read(), response.reason or '')
 
 
 async def http_transaction(pool: HTTPPool, request: HTTPRequest) -> dict | None:
-    async with pool as session:
-        async with session.request(**request.to_session) as response:
-            return await response.json()
+    # through send(), so cached and taped pools serve this path too
+    response = await pool.send(request)
+    return response.json() if response.body else None
+
+
+async def http_request(pool: HTTPPool, request: HTTPRequest) -> HTTPResponse:
+    response = await pool.send(request)
+    response.raise_for_status(request)
+    return response
@@ -0,0 +1,66 @@
+import json
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+# fastest installed backend wins; the stdlib is always there to fall back on
+BACKEND = 'orjson' if orjson else 'msgspec' if msgspec else 'json'
+
+
+def loads(body: bytes | str) -> Any:
+    if orjson:
+        return orjson.loads(body)
+    if msgspec:
+        return msgspec.json.decode(body)
+    return json.loads(body)
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson:
+        return orjson.dumps(obj)
+    if msgspec:
+        return msgspec.json.encode(obj)
+    return json.dumps(obj).encode()
+
+
+class Decoder:
+    """Decodes a body into `shape` when msgspec is installed, otherwise into plain dicts and lists"""
+
+    def __init__(self, shape: Optional[type] = None):
+        self._shape = shape if msgspec else None
+        self._decoder = msgspec.json.Decoder(shape) if self._shape is not None else None
+
+    @property
+    def typed(self) -> bool:
+        return self._decoder is not None
+
+    def decode(self, body: bytes | str) -> Any:
+        if self._decoder:
+            try:
+                return self._decoder.decode(body)
+            except msgspec.ValidationError:
+                pass  # the vendor drifted from the declared shape; plain containers still format fine
+        return loads(body)
+
+
+DEFAULT = Decoder()
+
+
+def is_struct(obj: Any) -> bool:
+    return msgspec is not None and isinstance(obj, msgspec.Struct)
+
+
+def struct(name: str, fields: tuple[tuple[str, Any], ...]) -> Optional[type]:
+    # every field optional: vendors omit keys freely, and unknown keys are skipped without being materialised
+    if not msgspec:
+        return None
+    return msgspec.defstruct(name, [(field, Optional[dtype], None) for field, dtype in fields])
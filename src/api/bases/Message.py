@@ -1,8 +1,9 @@
-import json
 import jsonschema
 import uuid
 import struct
 from abc import ABC, abstractmethod
+from functools import cache
+from src.api.bases import Json
 
 
 _MESSAGE_SCHEMA = {
@@ -119,18 +120,19 @@ class JsonMessage(StringMessage):
     def __init__(self, msg: bytes):
         super().__init__(msg)
 
-        self.VALIDATOR.check_schema(self.SCHEMA)
-
-        jsonschema.validate(
-            instance=self.content,
-            schema=self.SCHEMA,
-            cls=self.VALIDATOR,
-            format_checker=self.VALIDATOR.FORMAT_CHECKER
-        )
+        # parsed once, straight from the raw bytes; validated against a validator built once per class
+        self._json = Json.loads(self._content)
+        _validator(type(self)).validate(self._json)
 
     @property
     def content(self) -> dict:
-        return json.loads(super().content)
+        return self._json
+
+
+@cache
+def _validator(cls: type[JsonMessage]) -> jsonschema.protocols.Validator:
+    cls.VALIDATOR.check_schema(cls.SCHEMA)
+    return cls.VALIDATOR(cls.SCHEMA, format_checker=cls.VALIDATOR.FORMAT_CHECKER)
 
 
 class Request(JsonMessage):
@@ -209,7 +211,7 @@ def _make_string_message(message: str):
 def _make_json_message(message: dict):
     id = uuid.uuid4().bytes
     message_type = 0
-    message = bytes(json.dumps(message), StringMessage.ENCODING)
+    message = Json.dumps(message)
     message_length = len(message)
     fmt = f"!16s2Ix{message_length}s"
     return struct.pack(fmt, id, message_type, message_length, message)
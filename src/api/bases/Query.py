@@ -1,12 +1,17 @@
+import re
+import json
+from datetime import datetime
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from uuid import uuid4
 from enum import Enum
 from typing import Optional, Sequence, Any, Literal as StrLiteral
 from numpy import array
-from pandas import Series
+from pandas import Series, Timestamp, DateOffset
 from psycopg import Cursor
 from psycopg.rows import RowMaker, tuple_row, dict_row, class_row, args_row, kwargs_row
-from psycopg.sql import SQL, Identifier, Literal
+from psycopg.sql import SQL, Identifier, Literal, Composed
 from src.api.bases.IO import DBRequest, CopyDBRequest
-from src.api.bases.Data import Field
+from src.api.bases.Data import Data, Field
 
 
 def _np_row(cursor: Cursor) -> RowMaker:
@@ -62,6 +67,64 @@ def insert_rows(schema: str, table: str, columns: tuple[str, ...], rows: tuple[t
     return CopyDBRequest(body=body, values=rows)
 
 
+def create_staging(name: str, schema: str, table: str) -> DBRequest:
+    body = SQL("""CREATE TEMP TABLE {name} (LIKE {schema}.{table} INCLUDING DEFAULTS) ON COMMIT DROP;""")\
+        .format(name=Identifier(name), schema=Identifier(schema), table=Identifier(table))
+    return DBRequest(body=body)
+
+
+def merge_staging(
+        staging: str,
+        schema: str,
+        table: str,
+        columns: tuple[str, ...],
+        keys: tuple[str, ...]
+) -> DBRequest:
+    cols = SQL(", ").join(map(Identifier, columns))
+    key_cols = SQL(", ").join(map(Identifier, keys))
+    updates = tuple(col for col in columns if col not in keys)
+
+    if updates:
+        # skip rows whose values are unchanged so re-ingesting a window writes no dead tuples
+        action = SQL("DO UPDATE SET {assign} WHERE ({current}) IS DISTINCT FROM ({incoming})").format(
+            assign=SQL(", ").join(SQL("{col} = EXCLUDED.{col}").format(col=Identifier(col)) for col in updates),
+            current=SQL(", ").join(SQL("{table}.{col}").format(table=Identifier(table), col=Identifier(col))
+                                   for col in updates),
+            incoming=SQL(", ").join(SQL("EXCLUDED.{col}").format(col=Identifier(col)) for col in updates))
+    else:
+        action = SQL("DO NOTHING")
+
+    body = SQL(
+        """
+        WITH merged AS (
+            INSERT INTO {schema}.{table} ({cols})
+            SELECT DISTINCT ON ({key_cols}) {cols} FROM pg_temp.{staging} ORDER BY {key_cols}, ctid DESC
+            ON CONFLICT ({key_cols}) {action}
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged;
+        """
+    )\
+        .format(schema=Identifier(schema), table=Identifier(table), staging=Identifier(staging),
+                cols=cols, key_cols=key_cols, action=action)
+    return DBRequest(body=body, returns=(('inserted', int), ('updated', int)))
+
+
+def bulk_upsert(
+        schema: str,
+        table: str,
+        columns: tuple[str, ...],
+        keys: tuple[str, ...],
+        rows: tuple[tuple]
+) -> tuple[DBRequest, ...]:
+    staging = f"_stage_{table}_{uuid4().hex[:8]}"
+    return (
+        create_staging(name=staging, schema=schema, table=table),
+        insert_rows(schema="pg_temp", table=staging, columns=columns, rows=rows),
+        merge_staging(staging=staging, schema=schema, table=table, columns=columns, keys=keys),
+    )
+
+
 def upsert_values(
         schema: str,
         table: str,
@@ -89,30 +152,184 @@ def upsert_values(
     return DBRequest(body=body, values=values)
 
 
+OrderBy = tuple[str | tuple[str, StrLiteral['ASC', 'DESC']], ...]
+
+
+def _order_by(order_by: OrderBy) -> tuple[tuple[str, str], ...]:
+    return tuple((col, 'ASC') if isinstance(col, str) else (col[0], col[1].upper()) for col in order_by)
+
+
+def encode_token(key: tuple[str, ...], values: Sequence) -> str:
+    payload = json.dumps({'key': list(key), 'after': list(values)}, default=str)
+    return urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_token(token: str, key: tuple[str, ...]) -> tuple:
+    payload = json.loads(urlsafe_b64decode(token.encode()))
+    if tuple(payload['key']) != tuple(key):
+        raise ValueError(f"Continuation token was issued for order {payload['key']}, not {list(key)}")
+    return tuple(payload['after'])
+
+
+def continuation(data: Data, order_by: OrderBy) -> Optional[str]:
+    if not data.records:
+        return None
+    key = tuple(col for col, _ in _order_by(order_by))
+    names = [field.name for field in data.fields]
+    last = data.records[-1]
+    return encode_token(key, tuple(last[names.index(col)] for col in key))
+
+
 def select_values(
     schema: str,
     table: str,
     columns: tuple[Field],
-    conditions: Optional[tuple[tuple[str, StrLiteral['=', '!=', '>', '<', '>=', '<='], str], ...]] = None
+    conditions: Optional[tuple[tuple[str, StrLiteral['=', '!=', '>', '<', '>=', '<=', 'IN'], Any], ...]] = None,
+    time_range: Optional[tuple[str, Optional[Timestamp], Optional[Timestamp]]] = None,
+    order_by: Optional[OrderBy] = None,
+    limit: Optional[int] = None,
+    token: Optional[str] = None
 ) -> DBRequest:
-    returns = columns
-    columns = SQL(", ").join(map(Identifier, (col.name for col in columns)))
+    order_by = _order_by(order_by) if order_by else ()
+    names = tuple(col.name for col in columns)
+    returns = (*columns, *(Field(name=col, dtype=str) for col, _ in order_by if col not in names))
+    where, values = [], []
+
+    for name, op, val in conditions or ():
+        if op == 'IN':
+            where.append(SQL("{name} = ANY(%s)").format(name=Identifier(name)))
+            values.append(list(val))
+        else:
+            where.append(SQL("{name}{op}{val}").format(name=Identifier(name), op=SQL(op), val=Literal(val)))
+
+    if time_range:
+        # untyped constants coerce to the column's type at parse time, so the planner can prune
+        # partitions and match the index; a typed timestamptz parameter would force a cast
+        col, start, end = time_range
+        if start is not None:
+            where.append(SQL("{col} >= {start}").format(col=Identifier(col), start=Literal(str(start))))
+        if end is not None:
+            where.append(SQL("{col} < {end}").format(col=Identifier(col), end=Literal(str(end))))
+
+    if token:
+        if not order_by:
+            raise ValueError("A continuation token requires 'order_by'")
+        if len({direction for _, direction in order_by}) > 1:
+            raise ValueError("Keyset continuation requires a uniform sort direction")
+        key = tuple(col for col, _ in order_by)
+        after = decode_token(token, key)
+        # row comparison keeps the predicate on the leading index column(s)
+        where.append(SQL("({key}) {op} ({after})").format(
+            key=SQL(", ").join(map(Identifier, key)),
+            op=SQL(">" if order_by[0][1] == 'ASC' else "<"),
+            after=SQL(", ").join(SQL("%s") for _ in key)))
+        values.extend(after)
+
+    body = SQL("SELECT {columns} FROM {schema}.{table}").format(
+        columns=SQL(", ").join(map(Identifier, (col.name for col in returns))),
+        schema=Identifier(schema),
+        table=Identifier(table))
+
+    if where:
+        body += SQL(" WHERE ") + SQL(" AND ").join(where)
+
+    if order_by:
+        body += SQL(" ORDER BY ") + SQL(", ").join(
+            SQL("{col} {direction}").format(col=Identifier(col), direction=SQL(direction))
+            for col, direction in order_by)
+
+    if limit is not None:
+        body += SQL(" LIMIT %s")
+        values.append(limit)
+
+    predicates = (*(conditions or ()), *([(time_range[0], 'RANGE', None)] if time_range else []))
+    access = (schema, table, predicates, tuple(col for col, _ in order_by))
+    return DBRequest(body=body + SQL(";"), returns=returns, values=tuple(values) if values else None, access=access)
+
+
+def select_page(
+    schema: str,
+    table: str,
+    columns: tuple[Field],
+    key: tuple[str, ...],
+    after: Optional[tuple] = None,
+    limit: int = 100
+) -> tuple[DBRequest, tuple[int, ...]]:
+    # key columns not already selected are appended; the indices locate each key column in the returned rows
+    names = [column.name for column in columns]
+    extra = tuple(k for k in key if k not in names)
+    names += extra
+    request = select_values(
+        schema=schema,
+        table=table,
+        columns=(*columns, *(Field(name=k, dtype=str) for k in extra)),
+        order_by=key,
+        limit=limit,
+        token=encode_token(key, after) if after else None)
+    return request, tuple(names.index(k) for k in key)
+
+
+def split_range(start: Timestamp, end: Timestamp, n: int) -> tuple[tuple[Timestamp, Timestamp], ...]:
+    step = (end - start) / n
+    edges = [start + step * i for i in range(n)] + [end]
+    return tuple((lo, hi) for lo, hi in zip(edges[:-1], edges[1:]) if lo < hi)
+
+
+def split_values(values: Sequence, n: int) -> tuple[tuple, ...]:
+    return tuple(chunk for chunk in (tuple(values[i::n]) for i in range(n)) if chunk)
+
+
+def select_partitioned(
+    schema: str,
+    table: str,
+    columns: tuple[Field],
+    time_range: tuple[str, Timestamp, Timestamp],
+    n: int,
+    symbols: Optional[tuple[str, Sequence[str]]] = None,
+    conditions: Optional[tuple[tuple[str, StrLiteral['=', '!=', '>', '<', '>=', '<=', 'IN'], Any], ...]] = None
+) -> tuple[DBRequest, ...]:
+    col, start, end = time_range
+    conditions = tuple(conditions or ())
+
+    if symbols:
+        symbol_col, symbol_values = symbols
+        parts = tuple(
+            ((*conditions, (symbol_col, 'IN', chunk)), time_range) for chunk in split_values(symbol_values, n))
+    else:
+        parts = tuple((conditions, (col, lo, hi)) for lo, hi in split_range(start, end, n))
 
-    if conditions:
-        conditions = SQL(" AND ").join(
-            [SQL("{name}{op}{val}").format(
-                name=Identifier(name),
-                op=SQL(op),
-                val=Literal(val))
-                for name, op, val in conditions])
-        body = SQL("""SELECT ({columns}) FROM {schema}.{table} WHERE {conditions};"""). \
-            format(schema=Identifier(schema), table=Identifier(table), columns=columns, conditions=conditions)
+    return tuple(
+        select_values(
+            schema=schema, table=table, columns=columns, conditions=part_conditions or None,
+            time_range=part_range, order_by=(col,))
+        for part_conditions, part_range in parts)
 
-    else:
-        body = SQL("""SELECT ({columns}) FROM {schema}.{table};"""). \
-            format(schema=Identifier(schema), table=Identifier(table), columns=columns)
 
-    return DBRequest(body=body, returns=returns)
+def select_bounds(
+    schema: str,
+    table: str,
+    key: tuple[str, ...],
+    after: Optional[tuple] = None,
+    page: int = 100,
+    pages: int = 1
+) -> DBRequest:
+    returns = tuple(Field(name=k, dtype=str) for k in key)
+    order = SQL(", ").join(map(Identifier, key))
+    where = SQL("WHERE ({order}) > ({after})").format(order=order, after=SQL(", ").join(SQL("%s") for _ in key)) \
+        if after else SQL("")
+
+    body = SQL(
+        """
+        SELECT {order} FROM (
+            SELECT {order}, row_number() OVER (ORDER BY {order}) AS _rn
+            FROM (SELECT {order} FROM {schema}.{table} {where} ORDER BY {order} LIMIT %s) AS _keys
+        ) AS _numbered
+        WHERE _rn %% %s = 0 ORDER BY {order};
+        """
+    )\
+        .format(schema=Identifier(schema), table=Identifier(table), order=order, where=where)
+    values = (*(after or ()), page * pages, page)
+    return DBRequest(body=body, values=values, returns=returns)
 
 
 def create_database(name: str) -> DBRequest:
@@ -127,25 +344,142 @@ def create_schema(name: str) -> DBRequest:
     return DBRequest(body=body)
 
 
-def create_table(name: str, schema: str, columns: Optional[tuple[tuple[str, str]]]) -> DBRequest:
-    columns = SQL(", ").join([f'{Identifier(cname)} {ctype}' for (cname, ctype) in columns]) if columns else ""
-    body = SQL("""CREATE TABLE {schema}.{name}({columns});""")\
-        .format(schema=Identifier(schema), name=Identifier(name), columns=columns)
+def create_table(
+        name: str,
+        schema: str,
+        columns: Optional[tuple[tuple[str, str]]],
+        partition_by: Optional[str] = None
+) -> DBRequest:
+    columns = SQL(", ").join(
+        [SQL("{cname} {ctype}").format(cname=Identifier(cname), ctype=SQL(ctype)) for (cname, ctype) in columns]
+    ) if columns else SQL("")
+    partition = SQL(" PARTITION BY RANGE ({col})").format(col=Identifier(partition_by)) if partition_by else SQL("")
+    body = SQL("""CREATE TABLE {schema}.{name}({columns}){partition};""")\
+        .format(schema=Identifier(schema), name=Identifier(name), columns=columns, partition=partition)
     return DBRequest(body=body)
 
 
+PartitionInterval = StrLiteral['month', 'day']
+PARTITION_FMT = {'month': '%Y%m', 'day': '%Y%m%d'}
+
+
+def _partition_floor(ts: Timestamp, interval: PartitionInterval) -> Timestamp:
+    # normalize keeps the zone, so aware bounds yield aware partition edges
+    ts = Timestamp(ts).normalize()
+    return ts.replace(day=1) if interval == 'month' else ts
+
+
+def _partition_next(ts: Timestamp, interval: PartitionInterval) -> Timestamp:
+    return ts + DateOffset(months=1) if interval == 'month' else ts + DateOffset(days=1)
+
+
+def partition_name(table: str, lo: Timestamp, interval: PartitionInterval) -> str:
+    return f"{table}_p{lo.strftime(PARTITION_FMT[interval])}"
+
+
+def partition_bounds(
+        table: str,
+        start: Timestamp,
+        end: Timestamp,
+        interval: PartitionInterval = 'month'
+) -> tuple[tuple[str, Timestamp, Timestamp], ...]:
+    bounds, lo = [], _partition_floor(start, interval)
+    while lo < end:
+        hi = _partition_next(lo, interval)
+        bounds.append((partition_name(table, lo, interval), lo, hi))
+        lo = hi
+    return tuple(bounds)
+
+
+def create_partition(name: str, schema: str, table: str, start: Timestamp, end: Timestamp) -> DBRequest:
+    # DDL cannot take bind parameters; untyped literals coerce to the partition key's type
+    body = SQL("""CREATE TABLE IF NOT EXISTS {schema}.{name} PARTITION OF {schema}.{table} FOR VALUES FROM ({start}) TO ({end});""")\
+        .format(schema=Identifier(schema), name=Identifier(name), table=Identifier(table),
+                start=Literal(str(start)), end=Literal(str(end)))
+    return DBRequest(body=body)
+
+
+def detach_partition(name: str, schema: str, table: str, concurrently: bool = False) -> DBRequest:
+    body = SQL("""ALTER TABLE {schema}.{table} DETACH PARTITION {schema}.{name}{concurrently};""")\
+        .format(schema=Identifier(schema), table=Identifier(table), name=Identifier(name),
+                concurrently=SQL(" CONCURRENTLY") if concurrently else SQL(""))
+    return DBRequest(body=body)
+
+
+def create_partitions(
+        schema: str,
+        table: str,
+        start: Timestamp,
+        end: Timestamp,
+        interval: PartitionInterval = 'month',
+        existing: Sequence[str] = ()
+) -> tuple[DBRequest, ...]:
+    return tuple(
+        create_partition(name=name, schema=schema, table=table, start=lo, end=hi)
+        for name, lo, hi in partition_bounds(table, start, end, interval) if name not in existing)
+
+
+def detach_partitions(
+        schema: str,
+        table: str,
+        before: Timestamp,
+        interval: PartitionInterval = 'month',
+        existing: Sequence[str] = ()
+) -> tuple[DBRequest, ...]:
+    pattern = re.compile(rf"^{re.escape(table)}_p(?P<lo>\d+)$")
+    requests = []
+    for name in existing:
+        if not (match := pattern.match(name)):
+            continue
+        try:
+            # names carry no zone; read them in the zone of the cutoff they are compared against
+            lo = Timestamp(datetime.strptime(match.group('lo'), PARTITION_FMT[interval])).tz_localize(before.tz)
+        except ValueError:
+            continue
+        if _partition_next(lo, interval) <= before:
+            requests.append(detach_partition(name=name, schema=schema, table=table))
+    return tuple(requests)
+
+
 def create_column(name: str, schema: str, table: str, dtype: str) -> DBRequest:
     body = SQL("""ALTER TABLE {schema}.{table} ADD COLUMN {name} {dtype};""")\
         .format(schema=Identifier(schema), table=Identifier(table), name=Identifier(name), dtype=dtype)
     return DBRequest(body=body)
 
 
-def create_index(table: str, columns: tuple[str], schema: Optional[str] = None) -> DBRequest:
-    ix_name = "_".join([table, *columns])
+def _predicate(conditions: tuple[tuple[str, str, Any], ...]) -> Composed:
+    return SQL(" AND ").join(
+        SQL("{name} = ANY({val})").format(name=Identifier(name), val=Literal(list(val))) if op == 'IN' else
+        SQL("{name}{op}{val}").format(name=Identifier(name), op=SQL(op), val=Literal(val))
+        for name, op, val in conditions)
+
+
+def create_index(
+        table: str,
+        columns: tuple[str],
+        schema: Optional[str] = None,
+        method: StrLiteral['btree', 'brin', 'hash', 'gin', 'gist'] = 'btree',
+        include: Optional[tuple[str, ...]] = None,
+        where: Optional[tuple[tuple[str, StrLiteral['=', '!=', '>', '<', '>=', '<=', 'IN'], Any], ...]] = None,
+        unique: bool = False,
+        concurrently: bool = False,
+        name: Optional[str] = None
+) -> DBRequest:
+    ix_name = name or "_".join([table, *columns, *([method] if method != 'btree' else [])])
     columns = SQL(", ").join([Identifier(column) for column in columns])
-    body = SQL("""CREATE INDEX {ix_name} ON {schema}.{table} ({columns});""")\
-        .format(ix_name=Identifier(ix_name), schema=Identifier(schema), table=Identifier(table), columns=columns)
-    return DBRequest(body=body)
+    body = SQL("""CREATE {unique}INDEX {concurrently}IF NOT EXISTS {ix_name} ON {schema}.{table} USING {method} ({columns})""")\
+        .format(unique=SQL("UNIQUE ") if unique else SQL(""),
+                concurrently=SQL("CONCURRENTLY ") if concurrently else SQL(""),
+                ix_name=Identifier(ix_name), schema=Identifier(schema), table=Identifier(table),
+                method=SQL(method), columns=columns)
+
+    if include:
+        body += SQL(" INCLUDE ({include})").format(include=SQL(", ").join(map(Identifier, include)))
+    if where:
+        body += SQL(" WHERE ") + _predicate(where)
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    return DBRequest(body=body + SQL(";"), autocommit=concurrently)
 
 
 def list_database() -> DBRequest:
@@ -176,6 +510,99 @@ def list_index(table: str, schema: str) -> DBRequest:
     return DBRequest(body=body, returns=(('name', str),), values=(table, schema))
 
 
+def list_key(schema: str, table: str) -> DBRequest:
+    body = SQL(
+        """SELECT a.attname FROM pg_catalog.pg_index i
+        JOIN pg_catalog.pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = format('%%I.%%I', %s, %s)::regclass AND i.indisprimary
+        ORDER BY array_position(i.indkey::int2[], a.attnum);"""
+    )
+    return DBRequest(body=body, returns=(('name', str),), values=(schema, table))
+
+
+def count_estimate(schema: str, table: str) -> DBRequest:
+    body = SQL("""SELECT reltuples::bigint FROM pg_catalog.pg_class WHERE oid = format('%%I.%%I', %s, %s)::regclass;""")
+    return DBRequest(body=body, returns=(('rows', int),), values=(schema, table))
+
+
+def register_partitions(
+        schema: str,
+        table: str,
+        interval: PartitionInterval = 'month',
+        ahead: int = 3,
+        retain: Optional[int] = None
+) -> DBRequest:
+    body = SQL(
+        """INSERT INTO _meta.partitions (schema, "table", "interval", ahead, retain) VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (schema, "table") DO UPDATE
+        SET "interval" = EXCLUDED."interval", ahead = EXCLUDED.ahead, retain = EXCLUDED.retain;"""
+    )
+    return DBRequest(body=body, values=(schema, table, interval, ahead, retain))
+
+
+def select_partitions() -> DBRequest:
+    # the partition key column comes from the catalog; tables dropped since registration are skipped
+    body = SQL(
+        """SELECT p.schema, p."table", a.attname::text, p."interval", p.ahead, p.retain
+        FROM _meta.partitions p
+        JOIN pg_catalog.pg_partitioned_table pt ON pt.partrelid = to_regclass(format('%I.%I', p.schema, p."table"))
+        JOIN pg_catalog.pg_attribute a ON a.attrelid = pt.partrelid AND a.attnum = pt.partattrs[0];"""
+    )
+    returns = (('schema', str), ('table', str), ('column', str), ('interval', str), ('ahead', int), ('retain', int))
+    return DBRequest(body=body, returns=returns)
+
+
+def list_partition(schema: str, table: str) -> DBRequest:
+    body = SQL(
+        """SELECT c.relname FROM pg_catalog.pg_inherits i
+        JOIN pg_catalog.pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = format('%%I.%%I', %s, %s)::regclass;"""
+    )
+    return DBRequest(body=body, returns=(('name', str),), values=(schema, table))
+
+
+def list_index_columns(schema: Optional[str] = None) -> DBRequest:
+    body = SQL(
+        """SELECT n.nspname, t.relname, i.relname, am.amname,
+            array_agg(a.attname::text ORDER BY k.ord) FILTER (WHERE k.ord <= x.indnkeyatts)
+        FROM pg_catalog.pg_index x
+        JOIN pg_catalog.pg_class i ON i.oid = x.indexrelid
+        JOIN pg_catalog.pg_class t ON t.oid = x.indrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = t.relnamespace
+        JOIN pg_catalog.pg_am am ON am.oid = i.relam
+        CROSS JOIN LATERAL unnest(x.indkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_catalog.pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE n.nspname NOT IN ('pg_catalog', 'information_schema', 'pg_toast') AND (%s::text IS NULL OR n.nspname = %s)
+        GROUP BY n.nspname, t.relname, i.relname, am.amname;"""
+    )
+    returns = (('schema', str), ('table', str), ('index', str), ('method', str), ('columns', list))
+    return DBRequest(body=body, returns=returns, values=(schema, schema))
+
+
+def table_stats(schema: Optional[str] = None) -> DBRequest:
+    body = SQL(
+        """SELECT schemaname, relname, seq_scan, seq_tup_read, coalesce(idx_scan, 0),
+            n_live_tup, n_tup_ins, n_tup_upd + n_tup_del
+        FROM pg_catalog.pg_stat_user_tables
+        WHERE %s::text IS NULL OR schemaname = %s;"""
+    )
+    returns = (('schema', str), ('table', str), ('seq_scan', int), ('seq_tup_read', int), ('idx_scan', int),
+               ('live', int), ('inserted', int), ('modified', int))
+    return DBRequest(body=body, returns=returns, values=(schema, schema))
+
+
+def table_width(schema: Optional[str] = None) -> DBRequest:
+    # planner statistics: average stored bytes per row, summed over columns
+    body = SQL(
+        """SELECT schemaname, tablename, sum(avg_width)::int
+        FROM pg_catalog.pg_stats
+        WHERE %s::text IS NULL OR schemaname = %s
+        GROUP BY schemaname, tablename;"""
+    )
+    returns = (('schema', str), ('table', str), ('width', int))
+    return DBRequest(body=body, returns=returns, values=(schema, schema))
+
+
 def update_database(name: str, new_name: Optional[str] = None, new_param: Optional[tuple[str, str]] = None) -> DBRequest:
     if new_name:
         body = SQL("""ALTER DATABASE {name} RENAME TO {new_name};""")\
@@ -294,20 +721,95 @@ def delete_index(name: str, schema: Optional[str] = None) -> DBRequest:
     return DBRequest(body=body)
 
 
-def snapshot():
+def snapshot(schema: Optional[str] = None, table: Optional[str] = None) -> DBRequest:
     db_exclude = ("postgres", "template0", "template1")
     schema_exclude = ("public", "information_schema", "pg_catalog", "pg_toast")
+    conditions, values = [], []
+    for name, val in (("table_schema", schema), ("table_name", table)):
+        if val is not None:
+            conditions.append(SQL("AND {name}=%s").format(name=Identifier(name)))
+            values.append(val)
+
     body = SQL(
         """
         SELECT column_name, data_type, column_default, table_catalog, table_schema, table_name
         FROM information_schema.columns
-        WHERE table_catalog NOT IN ({db_exclude}) AND table_schema NOT IN ({schema_exclude});
+        WHERE table_catalog NOT IN ({db_exclude}) AND table_schema NOT IN ({schema_exclude}) {conditions};
         """
     )\
         .format(db_exclude=SQL(", ").join(map(Literal, db_exclude)),
-                schema_exclude=SQL(", ").join(map(Literal, schema_exclude)))
+                schema_exclude=SQL(", ").join(map(Literal, schema_exclude)),
+                conditions=SQL(" ").join(conditions))
     returns = (('column', str), ('type', str), ('default', str), ('database', str), ('schema', str), ('table', str))
-    return DBRequest(body=body, returns=returns)
+    return DBRequest(body=body, returns=returns, values=tuple(values) if values else None)
+
+
+def listen(channel: str) -> DBRequest:
+    body = SQL("""LISTEN {channel};""")\
+        .format(channel=Identifier(channel))
+    return DBRequest(body=body)
+
+
+def select_coverage(vendor: Optional[str] = None, symbol: Optional[str] = None) -> DBRequest:
+    body = SQL(
+        """SELECT vendor, symbol, field, start, "end" FROM _meta.coverage
+        WHERE (%s::text IS NULL OR vendor = %s) AND (%s::text IS NULL OR symbol = %s)
+        ORDER BY vendor, symbol, field, start;"""
+    )
+    returns = (('vendor', str), ('symbol', str), ('field', str), ('start', Timestamp), ('end', Timestamp))
+    return DBRequest(body=body, returns=returns, values=(vendor, vendor, symbol, symbol))
+
+
+def merge_coverage(vendor: str, symbol: str, field: str, start: Timestamp, end: Timestamp) -> DBRequest:
+    # absorb every stored interval that overlaps or touches [start, end) into a single row
+    body = SQL(
+        """WITH absorbed AS (
+            DELETE FROM _meta.coverage
+            WHERE vendor = %(vendor)s AND symbol = %(symbol)s AND field = %(field)s
+            AND start <= %(end)s AND "end" >= %(start)s
+            RETURNING start, "end"
+        )
+        INSERT INTO _meta.coverage (vendor, symbol, field, start, "end")
+        SELECT %(vendor)s, %(symbol)s, %(field)s, LEAST(%(start)s, min(start)), GREATEST(%(end)s, max("end"))
+        FROM absorbed;"""
+    )
+    return DBRequest(body=body, values={'vendor': vendor, 'symbol': symbol, 'field': field, 'start': start, 'end': end})
+
+
+def register_vendor(vendor: str) -> DBRequest:
+    body = SQL("INSERT INTO _meta.vendors (vendor) VALUES (%s) ON CONFLICT (vendor) DO NOTHING;")
+    return DBRequest(body=body, values=(vendor,))
+
+
+def select_watermark(template: str) -> DBRequest:
+    body = SQL("SELECT vendor, endpoint, symbol, mark FROM _meta.watermarks WHERE template = %s;")
+    returns = (('vendor', str), ('endpoint', str), ('symbol', str), ('mark', Timestamp))
+    return DBRequest(body=body, returns=returns, values=(template,))
+
+
+def advance_watermark(template: str, vendor: str, endpoint: str, symbol: str, mark: Timestamp) -> DBRequest:
+    # a mark only moves forward, so replaying an older spool segment cannot rewind it
+    body = SQL(
+        """INSERT INTO _meta.watermarks (template, vendor, endpoint, symbol, mark) VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (template, vendor, endpoint, symbol)
+        DO UPDATE SET mark = GREATEST(_meta.watermarks.mark, EXCLUDED.mark);"""
+    )
+    return DBRequest(body=body, values=(template, vendor, endpoint, symbol, mark))
+
+
+def select_latest(
+        schema: str,
+        table: str,
+        column: str,
+        key: str = 'symbol',
+        values: Optional[Sequence] = None
+) -> DBRequest:
+    where = SQL("WHERE {key} = ANY(%s)").format(key=Identifier(key)) if values else SQL("")
+    body = SQL("SELECT {key}, max({column}) FROM {schema}.{table} {where} GROUP BY {key};")\
+        .format(key=Identifier(key), column=Identifier(column), schema=Identifier(schema), table=Identifier(table),
+                where=where)
+    returns = ((key, str), (column, Timestamp))
+    return DBRequest(body=body, returns=returns, values=(list(values),) if values else None)
 
 
 def resolve_type(schema: str, table: str, column: str):
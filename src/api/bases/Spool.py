@@ -0,0 +1,334 @@
+import os
+import json
+import zlib
+import time
+import struct
+import asyncio
+import threading
+from dataclasses import dataclass
+from datetime import date, time as dtime, datetime
+from pathlib import Path
+from typing import Optional, Iterator, Any
+from pandas import Timestamp, Timedelta, isna
+from src import config
+from src.api.bases import Query, Logger
+from src.api.bases.Data import Data, Field
+from src.api.bases.IO import DBPool, db_script, db_transaction
+
+
+ROOT = Path(config.PROJECT_ENV['SERVER_ROOT']) / 'spool'
+EXT = '.spool'
+QUARANTINE = 'quarantine'
+MAX_ATTEMPTS = 3  # failed replays before a segment is set aside
+FMT_RECORD = '!II'  # payload length, crc32
+FMT_LENGTH = '!I'
+DTYPES = {t.__name__: t for t in (str, int, float, bool, Timestamp, datetime, date, dtime)}
+LOGGER = Logger.logger()
+
+
+"""
+COLUMNAR CODEC
+"""
+
+
+def _encode_stamp(value: Any) -> list:
+    # UTC nanoseconds with the zone beside them, so tz-aware stamps come back aware and naive ones naive
+    value = Timestamp(value)
+    return [value.value, str(value.tz) if value.tz else None]
+
+
+def _decode_stamp(value: int | list) -> Timestamp:
+    if isinstance(value, int):
+        return Timestamp(value)  # segments written before zones were kept
+    ns, tz = value
+    return Timestamp(ns, tz='UTC').tz_convert(tz) if tz else Timestamp(ns)
+
+
+def _encode_value(value: Any, dtype: type) -> Any:
+    if value is None or (not isinstance(value, str) and isna(value)):
+        return None
+    if dtype is Timestamp:
+        return _encode_stamp(value)
+    if dtype in (datetime, date, dtime):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(value: Any, dtype: type) -> Any:
+    if value is None:
+        return None
+    if dtype is Timestamp:
+        return _decode_stamp(value)
+    if dtype in (datetime, date, dtime):
+        return dtype.fromisoformat(value)
+    return value
+
+
+def _chunk(blob: bytes) -> bytes:
+    return struct.pack(FMT_LENGTH, len(blob)) + blob
+
+
+def _unchunk(buf: bytes, offset: int) -> tuple[bytes, int]:
+    (length,) = struct.unpack_from(FMT_LENGTH, buf, offset)
+    start = offset + struct.calcsize(FMT_LENGTH)
+    return buf[start:start + length], start + length
+
+
+@dataclass
+class Batch:
+    schema: str
+    table: str
+    keys: Optional[tuple[str, ...]]
+    data: Data
+    coverage: tuple[tuple[str, str, str, Timestamp, Timestamp], ...] = ()
+    watermarks: tuple[tuple[str, str, str, str, Timestamp], ...] = ()
+
+    def encode(self) -> bytes:
+        fields = self.data.fields
+        header = {
+            'schema': self.schema,
+            'table': self.table,
+            'keys': list(self.keys) if self.keys else None,
+            'fields': [(field.name, field.dtype.__name__) for field in fields],
+            'coverage': [(v, s, f, _encode_stamp(lo), _encode_stamp(hi)) for v, s, f, lo, hi in self.coverage],
+            'watermarks': [(t, v, e, s, _encode_stamp(mark)) for t, v, e, s, mark in self.watermarks],
+        }
+        columns = zip(*self.data.records) if self.data.records else ((),) * len(fields)
+        blobs = (
+            zlib.compress(json.dumps([_encode_value(v, field.dtype) for v in column]).encode())
+            for field, column in zip(fields, columns)
+        )
+        return _chunk(json.dumps(header).encode()) + b''.join(map(_chunk, blobs))
+
+    @classmethod
+    def decode(cls, payload: bytes) -> 'Batch':
+        header, offset = _unchunk(payload, 0)
+        header = json.loads(header)
+        fields = tuple(Field(name, DTYPES.get(dtype, str)) for name, dtype in header['fields'])
+
+        columns = []
+        for field in fields:
+            blob, offset = _unchunk(payload, offset)
+            columns.append([_decode_value(v, field.dtype) for v in json.loads(zlib.decompress(blob))])
+
+        keys = tuple(header['keys']) if header['keys'] else None
+        coverage = tuple(
+            (v, s, f, _decode_stamp(lo), _decode_stamp(hi)) for v, s, f, lo, hi in header.get('coverage', ()))
+        watermarks = tuple((t, v, e, s, _decode_stamp(mark)) for t, v, e, s, mark in header.get('watermarks', ()))
+        data = Data(fields=fields, records=tuple(zip(*columns)))
+        return cls(header['schema'], header['table'], keys, data, coverage, watermarks)
+
+
+"""
+SPOOL
+"""
+
+
+class Spool:
+    """Append-only, segment-file buffer between vendor fetches and database writes"""
+
+    def __init__(
+            self,
+            root: Path = ROOT,
+            segment_bytes: int = 64 * 2 ** 20,
+            sync_every: int = 64,
+            sync_interval: float = 1.0
+    ):
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._segment_bytes = segment_bytes
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._draining = asyncio.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._attempts: dict[Path, int] = {}
+
+        # a fresh segment on every start seals whatever a previous process left behind for replay
+        segments = self._segments()
+        self._seq = int(segments[-1].stem) + 1 if segments else 0
+        self._file = open(self._path(self._seq), 'ab')
+
+    def _path(self, seq: int) -> Path:
+        return self._root / f"{seq:012d}{EXT}"
+
+    def _segments(self) -> list[Path]:
+        return sorted(self._root.glob(f"*{EXT}"))
+
+    @property
+    def draining(self) -> asyncio.Lock:
+        return self._draining
+
+    @property
+    def current(self) -> Path:
+        return self._path(self._seq)
+
+    def append(
+            self,
+            schema: str,
+            table: str,
+            data: Data,
+            keys: Optional[tuple[str, ...]] = None,
+            coverage: tuple[tuple[str, str, str, Timestamp, Timestamp], ...] = (),
+            watermarks: tuple[tuple[str, str, str, str, Timestamp], ...] = ()
+    ):
+        payload = Batch(schema, table, keys, data, coverage, watermarks).encode()
+        record = struct.pack(FMT_RECORD, len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            self._file.write(record)
+            self._unsynced += 1
+            if self._unsynced >= self._sync_every or time.monotonic() - self._last_sync >= self._sync_interval:
+                self._sync()
+            if self._file.tell() >= self._segment_bytes:
+                self._roll()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced, self._last_sync = 0, time.monotonic()
+
+    def _roll(self):
+        self._sync()
+        self._file.close()
+        self._seq += 1
+        self._file = open(self._path(self._seq), 'ab')
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def roll(self) -> bool:
+        with self._lock:
+            if self._file.tell() == 0:
+                return False
+            self._roll()
+            return True
+
+    def sealed(self) -> list[Path]:
+        with self._lock:
+            return [path for path in self._segments() if path != self.current]
+
+    @staticmethod
+    def read(path: Path) -> Iterator[Batch]:
+        with open(path, 'rb') as file:
+            buf = file.read()
+
+        offset, header_size = 0, struct.calcsize(FMT_RECORD)
+        while offset + header_size <= len(buf):
+            length, crc = struct.unpack_from(FMT_RECORD, buf, offset)
+            payload = buf[offset + header_size:offset + header_size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break  # torn tail from a crash mid-write; everything before it is intact
+            yield Batch.decode(payload)
+            offset += header_size + length
+
+    def ack(self, path: Path):
+        os.remove(path)
+        self._attempts.pop(path, None)
+
+    def fail(self, path: Path) -> int:
+        self._attempts[path] = self._attempts.get(path, 0) + 1
+        return self._attempts[path]
+
+    def quarantine(self, path: Path) -> Path:
+        # out of the replay order, but kept for inspection and manual replay
+        target = self._root / QUARANTINE / path.name
+        target.parent.mkdir(exist_ok=True)
+        os.replace(path, target)
+        self._attempts.pop(path, None)
+        return target
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+
+"""
+FLUSHER
+"""
+
+
+def _partitions(
+        schema: str,
+        table: str,
+        columns: tuple[str, ...],
+        rows: list[tuple],
+        partitions: dict[tuple[str, str], tuple[str, str]]
+) -> tuple:
+    # a row with no partition to land in would fail the whole segment; its partition is created first
+    if (schema, table) not in partitions:
+        return ()
+    column, interval = partitions[(schema, table)]
+    if column not in columns:
+        return ()
+    ix = columns.index(column)
+    stamps = [row[ix] for row in rows if row[ix] is not None]
+    if not stamps:
+        return ()
+    return Query.create_partitions(
+        schema=schema, table=table, start=min(stamps), end=max(stamps) + Timedelta(1), interval=interval)
+
+
+def _requests(batches: list[Batch], partitions: Optional[dict[tuple[str, str], tuple[str, str]]] = None) -> tuple:
+    # coalesce a segment into one COPY (or staged upsert) per target table
+    groups: dict[tuple, list[tuple]] = {}
+    for batch in batches:
+        key = (batch.schema, batch.table, batch.keys, tuple((f.name, f.dtype) for f in batch.data.fields))
+        groups.setdefault(key, []).extend(batch.data.records)
+
+    requests = ()
+    for (schema, table, keys, fields), rows in groups.items():
+        columns = tuple(name for name, _ in fields)
+        requests += _partitions(schema, table, columns, rows, partitions or {})
+        if keys:
+            requests += Query.bulk_upsert(
+                schema=schema, table=table, columns=columns, keys=keys, rows=tuple(rows))
+        else:
+            requests += (Query.insert_rows(schema=schema, table=table, columns=columns, rows=tuple(rows)),)
+
+    # coverage and watermarks commit in the same transaction as the rows they describe, after the vendor rows
+    # their foreign keys need
+    vendors = {cov[0] for batch in batches for cov in batch.coverage} | \
+        {wm[1] for batch in batches for wm in batch.watermarks}
+    requests += tuple(map(Query.register_vendor, sorted(vendors)))
+    for batch in batches:
+        requests += tuple(Query.merge_coverage(*cov) for cov in batch.coverage)
+        requests += tuple(Query.advance_watermark(*wm) for wm in batch.watermarks)
+    return requests
+
+
+async def drain(spool: Spool, pool: DBPool) -> int:
+    drained = 0
+    async with spool.draining:  # a segment is replayed by exactly one drainer
+        if not (sealed := spool.sealed()):
+            return drained
+        result = await db_transaction(pool, Query.select_partitions())
+        partitions = {(schema, table): (column, interval) for schema, table, column, interval, _, _ in
+                      result.content.records}
+        for path in sealed:
+            try:
+                batches = await asyncio.to_thread(lambda: list(spool.read(path)))
+                if batches:
+                    await db_script(pool, _requests(batches, partitions))
+            except Exception as e:
+                # segments replay in order, so a failure holds back the ones after it until it is quarantined
+                if spool.fail(path) < MAX_ATTEMPTS:
+                    raise
+                target = await asyncio.to_thread(spool.quarantine, path)
+                LOGGER.error(f'spool segment failed {MAX_ATTEMPTS} times, quarantined to {target}: {e}')
+                continue
+            spool.ack(path)
+            drained += sum(batch.data.dims[0] for batch in batches)
+    return drained
+
+
+async def flusher(spool: Spool, pool: DBPool, interval: float = 1.0):
+    while True:
+        await asyncio.to_thread(spool.roll)
+        try:
+            await drain(spool, pool)
+        except Exception as e:
+            LOGGER.warning(f'spool drain failed, retrying in {interval}s: {e}')  # segments stay on disk
+        await asyncio.sleep(interval)
@@ -0,0 +1,117 @@
+import os
+import json
+import zlib
+import time
+import random
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Optional, Literal
+from src import config
+from src.api.bases.IO import HTTPPool, HTTPRequest, HTTPResponse
+
+
+ROOT = Path(config.PROJECT_ENV['SERVER_ROOT']) / 'tapes'
+Latency = float | tuple[float, float] | Literal['recorded']
+
+
+def _write(path: Path, content: bytes):
+    # write-then-rename, so a crash never leaves a torn entry behind
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    tmp.write_bytes(content)
+    os.replace(tmp, path)
+
+
+class Tape:
+    """Request -> response pairs on disk. Bodies are zlib-compressed and content-addressed (identical payloads are
+    stored once); each request's entry, named by its fingerprint, points at its body"""
+
+    def __init__(self, name: str, root: Path = ROOT):
+        self._root = root / name
+        self._entries = self._root / 'requests'
+        self._bodies = self._root / 'bodies'
+        self._entries.mkdir(parents=True, exist_ok=True)
+        self._bodies.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def __len__(self):
+        return sum(1 for _ in self._entries.glob('*.json'))
+
+    def __contains__(self, request: HTTPRequest) -> bool:
+        return (self._entries / f'{request.fingerprint}.json').exists()
+
+    def put(self, request: HTTPRequest, response: HTTPResponse, elapsed: float = 0.):
+        digest = hashlib.sha256(response.body).hexdigest()
+        if not (body := self._bodies / f'{digest}.z').exists():
+            _write(body, zlib.compress(response.body))
+        entry = {
+            'method': request.meth, 'url': request.url, 'params': request.params,
+            'status': response.status, 'reason': response.reason, 'headers': response.headers, 'body': digest, 'elapsed': elapsed,
+        }
+        _write(self._entries / f'{request.fingerprint}.json', json.dumps(entry, default=str).encode())
+
+    def get(self, request: HTTPRequest) -> tuple[HTTPResponse, float]:
+        try:
+            entry = json.loads((self._entries / f'{request.fingerprint}.json').read_bytes())
+        except FileNotFoundError:
+            raise LookupError(f'not on tape {self._root.name}: {request.meth} {request.url} {request.params}')
+        body = zlib.decompress((self._bodies / f"{entry['body']}.z").read_bytes())
+        return HTTPResponse(entry['status'], entry['headers'], body, entry.get('reason', '')), entry['elapsed']
+
+
+class RecordingPool(HTTPPool):
+    """A live pool that also writes every exchange, errors included, to a tape"""
+
+    def __init__(self, tape: Tape, **kwargs):
+        super().__init__(**kwargs)
+        self._tape = tape
+
+    async def send(self, request: HTTPRequest) -> HTTPResponse:
+        start = time.perf_counter()
+        response = await super().send(request)
+        await asyncio.to_thread(self._tape.put, request, response, time.perf_counter() - start)
+        return response
+
+
+class ReplayPool(HTTPPool):
+    """Serves a tape back without touching the network. `latency` is injected per request: fixed seconds,
+    a (low, high) uniform range, or 'recorded' to replay the latency measured at record time"""
+
+    def __init__(self, tape: Tape, latency: Latency = 0.):
+        self._tape = tape
+        self._latency = latency
+
+    @property
+    def alive(self) -> bool:
+        return True
+
+    async def close(self):
+        return None
+
+    def _delay(self, recorded: float) -> float:
+        if self._latency == 'recorded':
+            return recorded
+        if isinstance(self._latency, tuple):
+            return random.uniform(*self._latency)
+        return self._latency
+
+    async def send(self, request: HTTPRequest) -> HTTPResponse:
+        response, elapsed = await asyncio.to_thread(self._tape.get, request)
+        if delay := self._delay(elapsed):
+            await asyncio.sleep(delay)
+        return response
+
+
+def pool(name: str, mode: Literal['live', 'record', 'replay'] = 'live', latency: Latency = 0.) -> HTTPPool:
+    match mode:
+        case 'live':
+            return HTTPPool()
+        case 'record':
+            return RecordingPool(Tape(name))
+        case 'replay':
+            return ReplayPool(Tape(name), latency=latency)
+        case _:
+            raise ValueError(f'Invalid mode: {mode}')
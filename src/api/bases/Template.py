@@ -1,13 +1,22 @@
 import os
 import json
 import jsonschema
+from collections import defaultdict
+from dataclasses import dataclass
 from pathlib import Path
+from pandas import Timestamp, Timedelta
 from src import config
-from typing import Optional
+from src.api.bases import Engine
+from src.api.bases.Coverage import Coverage
+from src.api.bases.Data import Data
+from typing import Optional, Callable
 
 
 ROOT = Path(config.PROJECT_ENV["ROOT"]) / "src" / "api" / "templates"
 VALIDATOR = jsonschema.Draft202012Validator
+DEFAULT_RESOLUTION = Timedelta(days=1)
+DEFAULT_WIDTH = 8  # bytes per field when the table has no planner statistics yet
+LATENCY = 0.5  # seconds per vendor call, before rate limits
 
 
 def validate(schema: dict, instance: Optional[dict] = None) -> Optional[Exception]:
@@ -27,45 +36,262 @@ def validate(schema: dict, instance: Optional[dict] = None) -> Optional[Exceptio
             return e
 
 
-def get_schema() -> dict:
-    with open(ROOT / "_schema.json") as file:
-        schema = json.load(file)
-    if not (e := validate(schema)):
-        return schema
-    else:
-        raise e
+"""
+COMPILED TEMPLATES
+"""
 
 
-def get_template(template_name: str) -> dict:
-    schema = get_schema()
-    with open(ROOT / f"{template_name}.json") as file:
-        template = json.load(file)
-    if not (e := validate(schema, template)):
-        return template
-    else:
-        raise e
+@dataclass(frozen=True)
+class Entry:
+    vendor: str
+    endpoint: str
+    symbols: tuple[Optional[str], ...]
+    fields: Optional[tuple[str, ...]]
+    start: Optional[Timestamp]
+    end: Optional[Timestamp]
+    resolution: Optional[Timedelta]
 
+    def calls(self, now: Timestamp) -> tuple[Engine.Call, ...]:
+        end = min(self.end, now) if self.end is not None else now
+        return tuple(
+            Engine.Call(self.vendor, self.endpoint, symbol, self.fields, self.start, end, self.resolution)
+            for symbol in self.symbols)
 
-def get_templates() -> dict:
-    return dict(
-        zip(map(lambda x: x.stem, ROOT.glob("*.json")),
-            map(lambda x: get_template(x.stem), ROOT.glob("*.json")))
+
+@dataclass(frozen=True)
+class Compiled:
+    name: str
+    template: dict
+    orientation: Engine.Orientation
+    entries: tuple[Entry, ...]
+
+    def calls(self, now: Timestamp) -> tuple[Engine.Call, ...]:
+        return tuple(call for entry in self.entries for call in entry.calls(now))
+
+
+def _timestamp(value: Optional[str]) -> Optional[Timestamp]:
+    return Timestamp(value) if value else None
+
+
+def compile_template(name: str, template: dict) -> Compiled:
+    entries = tuple(
+        Entry(
+            vendor=entry['vendor'],
+            endpoint=entry['endpoint'],
+            symbols=tuple(entry.get('symbols') or (None,)),
+            fields=tuple(entry['fields']) if entry.get('fields') else None,
+            start=_timestamp(entry.get('start', template.get('start'))),
+            end=_timestamp(entry.get('end', template.get('end'))),
+            resolution=Timedelta(res) if (res := entry.get('resolution', template.get('resolution'))) else None)
+        for entry in template['template']
     )
+    return Compiled(name, template, template.get('orientation', 'wide'), entries)
 
 
-def put_template(template_name: str, template: dict):
-    schema = get_schema()
-    if not (e := validate(schema, template)):
-        if (fp := ROOT / f"{template_name}.json").exists():
+def _stat(path: Path) -> tuple[int, int, int]:
+    st = path.stat()
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class Registry:
+    """Schema and validator are built once; templates are recompiled only when their file changes"""
+
+    def __init__(self, root: Path = ROOT):
+        self._root = Path(root)
+        self._schema: Optional[tuple[tuple[int, int, int], dict, jsonschema.protocols.Validator]] = None
+        self._templates: dict[str, tuple[tuple[int, int, int], Compiled]] = {}
+
+    def _path(self, name: str) -> Path:
+        return self._root / f"{name}.json"
+
+    @property
+    def schema(self) -> dict:
+        return self._load_schema()[1]
+
+    @property
+    def validator(self) -> jsonschema.protocols.Validator:
+        return self._load_schema()[2]
+
+    def _load_schema(self):
+        stat = _stat(path := self._root / "_schema.json")
+        if self._schema is None or self._schema[0] != stat:
+            with open(path) as file:
+                schema = json.load(file)
+            if e := validate(schema):
+                raise e
+            self._schema = stat, schema, VALIDATOR(schema, format_checker=VALIDATOR.FORMAT_CHECKER)
+            self._templates.clear()  # a new schema may reject templates compiled under the old one
+        return self._schema
+
+    def check(self, template: dict):
+        if e := jsonschema.exceptions.best_match(self.validator.iter_errors(template)):
+            raise e
+
+    def names(self) -> tuple[str, ...]:
+        return tuple(sorted(p.stem for p in self._root.glob("*.json") if not p.stem.startswith("_")))
+
+    def get(self, name: str) -> Compiled:
+        validator = self.validator
+        stat = _stat(path := self._path(name))
+        if (cached := self._templates.get(name)) and cached[0] == stat:
+            return cached[1]
+
+        with open(path) as file:
+            template = json.load(file)
+        if e := jsonschema.exceptions.best_match(validator.iter_errors(template)):
+            raise e
+        compiled = compile_template(name, template)
+        self._templates[name] = stat, compiled
+        return compiled
+
+    def all(self) -> dict[str, Compiled]:
+        return {name: self.get(name) for name in self.names()}
+
+    def put(self, name: str, template: dict, exist_ok: bool = True):
+        self.check(template)
+        if (fp := self._path(name)).exists():
+            if not exist_ok:
+                raise NameError("Template already exists")
             os.remove(fp)
         with open(fp, "x") as f:
             f.write(json.dumps(template, indent=4))
-    else:
-        raise e
+        self.invalidate(name)
+
+    def invalidate(self, name: Optional[str] = None):
+        if name is None:
+            self._schema = None
+            self._templates.clear()
+        else:
+            self._templates.pop(name, None)
+
+
+REGISTRY = Registry()
+
+
+def get_schema() -> dict:
+    return REGISTRY.schema
+
+
+def get_template(template_name: str) -> dict:
+    return REGISTRY.get(template_name).template
+
+
+def get_templates() -> dict:
+    return {name: compiled.template for name, compiled in REGISTRY.all().items()}
+
+
+def put_template(template_name: str, template: dict):
+    REGISTRY.put(template_name, template)
 
 
 def create_template(template_name: str, template: dict):
-    if not (ROOT / f"{template_name}.json").exists():
-        put_template(template_name, template)
-    else:
-        raise NameError("Template already exists")
+    REGISTRY.put(template_name, template, exist_ok=False)
+
+
+"""
+PLANNING
+"""
+
+
+@dataclass(frozen=True)
+class EntryPlan:
+    vendor: str
+    endpoint: str
+    calls: int
+    rows: int
+    bytes: int
+    covered: float
+    seconds: float
+
+
+@dataclass(frozen=True)
+class Plan:
+    entries: tuple[EntryPlan, ...]
+
+    @property
+    def calls(self) -> int:
+        return sum(entry.calls for entry in self.entries)
+
+    @property
+    def rows(self) -> int:
+        return sum(entry.rows for entry in self.entries)
+
+    @property
+    def bytes(self) -> int:
+        return sum(entry.bytes for entry in self.entries)
+
+    @property
+    def seconds(self) -> float:
+        # vendors run side by side; calls to one vendor queue behind its limits
+        per_vendor = defaultdict(float)
+        for entry in self.entries:
+            per_vendor[entry.vendor] += entry.seconds
+        return max(per_vendor.values(), default=0.0)
+
+
+def _density(
+        vendor: str,
+        table: str,
+        fields: tuple[str, ...],
+        coverage: Coverage,
+        live: dict[tuple[str, str], int]
+) -> Optional[float]:
+    # rows per symbol-second observed so far: live rows over the time span the table already covers. coverage is
+    # kept per field, and every stored field of a row covers the same span, so each symbol counts its span once
+    if not (rows := live.get((vendor, table))):
+        return None
+    spans: dict[str, float] = {}
+    for (v, symbol, f), intervals in coverage.items():
+        if v == vendor and f in fields:
+            seconds = sum((hi - lo).total_seconds() for lo, hi in intervals)
+            spans[symbol] = max(spans.get(symbol, 0.0), seconds)
+    span = sum(spans.values())
+    return rows / span if span else None
+
+
+def plan(
+        template: Compiled,
+        coverage: Optional[Coverage] = None,
+        stats: Optional[Data] = None,
+        widths: Optional[Data] = None,
+        rate_limits: Optional[dict[str, int]] = None,
+        limits: Optional[dict[str, int]] = None,
+        ranged: Callable[[str, str], bool] = lambda vendor, endpoint: True,
+        now: Optional[Timestamp] = None,
+        batch: Callable[[tuple[Engine.Call, ...]], tuple[Engine.Call, ...]] = lambda calls: calls
+) -> Plan:
+    coverage = coverage or Coverage()
+    live = {(schema, table): n for schema, table, _, _, _, n, _, _ in stats.records} if stats else {}
+    width = {(schema, table): w for schema, table, w in widths.records} if widths else {}
+    rate_limits, limits = rate_limits or {}, Engine.LIMITS if limits is None else limits
+
+    entries = ()
+    now = now or Timestamp.now(tz='UTC').tz_localize(None)
+    for entry in template.entries:
+        vendor, endpoint = entry.vendor, entry.endpoint
+        calls, fields = batch(entry.calls(now)), entry.fields or ()
+        density = 1 / entry.resolution.total_seconds() if entry.resolution else \
+            _density(vendor, endpoint, fields, coverage, live) or 1 / DEFAULT_RESOLUTION.total_seconds()
+
+        rows = total = missing = 0.0
+        for call in calls:
+            if not ranged(vendor, endpoint) or call.start is None:
+                rows += len(call.symbols)
+                continue
+            span = max((call.end - call.start).total_seconds(), 0.0)
+            for symbol in call.symbols:
+                gap = max(
+                    (sum((hi - lo).total_seconds() for lo, hi in coverage.missing(vendor, symbol, f, call.start, call.end))
+                     for f in fields),
+                    default=span)
+                total, missing, rows = total + span, missing + gap, rows + gap * density
+
+        row_bytes = width.get((vendor, endpoint)) or DEFAULT_WIDTH * (len(fields) + 1)
+        concurrency = limits.get(vendor, Engine.DEFAULT_LIMIT)
+        seconds = len(calls) * LATENCY / concurrency
+        if rate := rate_limits.get(vendor):
+            seconds = max(seconds, len(calls) * 60 / rate)  # rate_limit is requests per minute
+        entries += EntryPlan(
+            vendor=vendor, endpoint=endpoint, calls=len(calls), rows=int(rows), bytes=int(rows * row_bytes),
+            covered=1 - missing / total if total else 0.0, seconds=seconds),
+    return Plan(entries)
@@ -1,10 +1,19 @@
 import inspect
-from typing import Callable, Optional
+import asyncio
+import aiohttp
+from typing import Callable, Optional, AsyncIterator, Any
 from types import NoneType, ModuleType
 from pandas import Timestamp, Timedelta
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from requests import Response
-from src.api.bases.IO import HTTPRequest, Result
+from src.api.bases import Logger
+from src.api.bases.Data import Data
+from src.api.bases.IO import HTTPRequest, HTTPResponse, HTTPPool, Result, http_request
+
+
+RETRIES = 3
+BACKOFF = 2.  # seconds, doubled per retry when the vendor sends no Retry-After
+LOGGER = Logger.logger()
 
 
 @dataclass
@@ -18,10 +27,20 @@ class _MetaFunction:
         return self.func.__repr__()
 
 
+@dataclass
 class Authorization(_MetaFunction):
+    """Caches a vendor's token until expiry and renews it in the background before it lapses.
+    `func` returns a static token, or an (HTTPRequest, parse) pair whose parse gives a token or (token, expires_in)"""
+    LEAD = .1  # fraction of a token's lifetime left when the background renewal fires
+    RETRY = 30.  # seconds between background renewal attempts that failed
+
     def __post_init__(self):
         self._token = None
         self._timestamp = None
+        self._deadline: Optional[float] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._renewal: Optional[asyncio.TimerHandle] = None
+        self._renewing: Optional[asyncio.Task] = None
 
     @property
     def token(self) -> str:
@@ -39,8 +58,201 @@ class Authorization(_MetaFunction):
     def timestamp(self, timestamp: Timestamp):
         self._timestamp = timestamp
 
-    def refresh(self):
-        self.token, self.timestamp = self(), Timestamp.now()
+    @property
+    def valid(self) -> bool:
+        return self._token is not None and (self._deadline is None or asyncio.get_running_loop().time() < self._deadline)
+
+    async def get(self, pool: HTTPPool) -> str:
+        # hot path: a cached token is returned without awaiting anything
+        if self.valid:
+            return self._token
+        return await self.refresh(pool)
+
+    async def refresh(self, pool: HTTPPool) -> str:
+        # single flight: every concurrent caller awaits the same fetch
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._fetch(pool))
+        return await asyncio.shield(self._refreshing)
+
+    async def _fetch(self, pool: HTTPPool) -> str:
+        token, expires_in = await asyncio.to_thread(self), None
+        if isinstance(token, tuple):
+            request, parse = token
+            token = parse(await http_request(pool, request))
+            if isinstance(token, tuple):
+                token, expires_in = token
+        self.token, self.timestamp = token, Timestamp.now()
+        loop = asyncio.get_running_loop()
+        self._deadline = loop.time() + expires_in if expires_in else None
+        if expires_in:
+            self._schedule(pool, expires_in * (1 - self.LEAD))
+        return token
+
+    def _schedule(self, pool: HTTPPool, delay: float):
+        if self._renewal:
+            self._renewal.cancel()
+        self._renewal = asyncio.get_running_loop().call_later(delay, self._renew, pool)
+
+    def _renew(self, pool: HTTPPool):
+        self._renewing = asyncio.create_task(self._background(pool))  # held so the task is not collected
+
+    async def _background(self, pool: HTTPPool):
+        try:
+            await self.refresh(pool)
+        except Exception as e:
+            LOGGER.warning(f'token renewal failed for {self.func.__module__}: {e}')
+            # the cached token stays in use until its deadline; retry while there is time left
+            if self._deadline is not None and (remaining := self._deadline - asyncio.get_running_loop().time()) > 0:
+                self._schedule(pool, min(self.RETRY, remaining / 2))
+
+    def invalidate(self):
+        self._token, self._deadline = None, None
+
+
+"""
+PAGINATION
+"""
+
+
+class Throttle:
+    """Spaces a vendor's requests evenly so that no more than `rate` go out per minute"""
+
+    def __init__(self, rate: int):
+        self._interval = 60. / rate
+        self._next = 0.
+
+    async def wait(self):
+        # slots are claimed synchronously, so concurrent callers queue up without a lock
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next)
+        self._next = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def _request(
+        pool: HTTPPool,
+        request: HTTPRequest,
+        throttle: Optional[Throttle] = None,
+        retries: int = RETRIES
+) -> HTTPResponse:
+    # 429s are waited out (Retry-After when given) instead of failing the whole walk
+    for attempt in range(retries + 1):
+        if throttle:
+            await throttle.wait()
+        try:
+            return await http_request(pool, request)
+        except aiohttp.ClientResponseError as e:
+            if e.status != 429 or attempt == retries:
+                raise
+            delay = (e.headers or {}).get('Retry-After')
+            await asyncio.sleep(float(delay) if delay and delay.isdigit() else BACKOFF * 2 ** attempt)
+
+
+async def _completed(coros: list) -> AsyncIterator:
+    tasks = [asyncio.create_task(coro) for coro in coros]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _batch(
+        pool: HTTPPool,
+        requests: tuple[HTTPRequest, ...],
+        throttle: Optional[Throttle] = None
+) -> AsyncIterator[tuple[int, HTTPRequest, HTTPResponse]]:
+    async def _one(i: int, request: HTTPRequest) -> tuple[int, HTTPRequest, HTTPResponse]:
+        return i, request, await _request(pool, request, throttle)
+
+    async for item in _completed([_one(i, r) for i, r in enumerate(requests)]):
+        yield item
+
+
+def _with_params(request: HTTPRequest, **params) -> HTTPRequest:
+    if request.json is not None:
+        return replace(request, json=request.json | params)
+    return replace(request, params=(request.params or {}) | params)
+
+
+@dataclass(frozen=True)
+class Pages:
+    """Page-numbered APIs: the first response gives the page count, the rest are fetched concurrently"""
+    count: Callable[[HTTPResponse], int]
+    param: str = 'page'
+    first: int = 1
+    limit: int = 4  # pages in flight at once
+
+    async def walk(
+            self,
+            pool: HTTPPool,
+            request: HTTPRequest,
+            throttle: Optional[Throttle] = None
+    ) -> AsyncIterator[tuple[int, HTTPRequest, HTTPResponse]]:
+        request = _with_params(request, **{self.param: self.first})
+        res = await _request(pool, request, throttle)
+        yield 0, request, res
+
+        semaphore = asyncio.Semaphore(self.limit)
+
+        async def _page(i: int) -> tuple[int, HTTPRequest, HTTPResponse]:
+            page = _with_params(request, **{self.param: self.first + i})
+            async with semaphore:
+                return i, page, await _request(pool, page, throttle)
+
+        async for item in _completed([_page(i) for i in range(1, self.count(res))]):
+            yield item
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """Cursor APIs: the next page is requested as soon as its cursor is known, before this page is formatted"""
+    next: Callable[[HTTPResponse], Optional[Any]]
+    param: str = 'start'
+
+    async def walk(
+            self,
+            pool: HTTPPool,
+            request: HTTPRequest,
+            throttle: Optional[Throttle] = None
+    ) -> AsyncIterator[tuple[int, HTTPRequest, HTTPResponse]]:
+        i, pending = 0, asyncio.create_task(_request(pool, request, throttle))
+        try:
+            while pending:
+                res = await pending
+                current, cursor = request, self.next(res)
+                if cursor:
+                    request = _with_params(request, **{self.param: cursor})
+                    pending = asyncio.create_task(_request(pool, request, throttle))
+                else:
+                    pending = None
+                yield i, current, res
+                i += 1
+        finally:
+            if pending:
+                pending.cancel()
+
+
+@dataclass(frozen=True)
+class Paginated:
+    request: HTTPRequest
+    paginator: Pages | Cursor
+
+
+@dataclass(frozen=True)
+class Capability:
+    """What one call to an endpoint can carry; vendors declare these per endpoint in CAPABILITIES"""
+    symbols: int = 1  # symbols per call
+    span: Optional[Timedelta | dict[Timedelta, Timedelta]] = None  # widest [start, end) per call, or per resolution
+    resolutions: Optional[tuple[Timedelta, ...]] = None  # bar sizes served; None if unconstrained
+
+    def serves(self, resolution: Optional[Timedelta]) -> bool:
+        return resolution is None or self.resolutions is None or resolution in self.resolutions
+
+    def window(self, resolution: Optional[Timedelta]) -> Optional[Timedelta]:
+        return self.span.get(resolution) if isinstance(self.span, dict) else self.span
 
 
 class Formatter(_MetaFunction):
@@ -89,6 +301,12 @@ class Endpoint:
     name: str
     getter: Getter
     formatter: Optional[Formatter]
+    throttle: Optional[Throttle] = None
+    capability: Capability = Capability()
+    ttl: Optional[Timedelta] = None
+
+    def _stamp(self, request: HTTPRequest) -> HTTPRequest:
+        return replace(request, ttl=self.ttl) if self.ttl is not None else request
 
     def __call__(self, **kwargs):
         bound_args = self.getter.bind(**kwargs)
@@ -98,6 +316,32 @@ class Endpoint:
         else:
             return res
 
+    async def fetch(self, pool: HTTPPool, **kwargs):
+        # blocking getters run off the loop; getters returning an HTTPRequest share the async pool
+        bound_args = self.getter.bind(**kwargs)
+        request = await asyncio.to_thread(self.getter, **bound_args)
+        if isinstance(request, Paginated):
+            return await self.collect(request.paginator.walk(pool, self._stamp(request.request), self.throttle))
+        if isinstance(request, tuple) and request and all(isinstance(r, HTTPRequest) for r in request):
+            # batched getters split one logical call into API-sized requests; they go out together
+            return await self.collect(_batch(pool, tuple(map(self._stamp, request)), self.throttle))
+        if isinstance(request, HTTPRequest):
+            res, params = await _request(pool, self._stamp(request), self.throttle), request.params
+        else:
+            res, params = request
+        if self.formatter and self.formatter.func:
+            return self.formatter.format(res, params)
+        else:
+            return res
+
+    async def collect(self, responses: AsyncIterator[tuple[int, HTTPRequest, HTTPResponse]]):
+        # each response is formatted as it lands, while later ones are still in flight; output keeps request order
+        parts = {}
+        async for i, request, res in responses:
+            parts[i] = self.formatter.format(res, request.params) if self.formatter and self.formatter.func else res
+        parts = [parts[i] for i in sorted(parts)]
+        return Data.concat(parts) if parts and isinstance(parts[0], Data) else parts
+
     @property
     def signature(self) -> inspect.Signature:
         return self.getter.signature
@@ -122,10 +366,17 @@ class Vendor:
     def __init__(self, name: str, vendor_module: ModuleType):
         self._name = name
         self._endpoints = {'auth': None}
+        self._authorization: Optional[Authorization] = None
+        # one throttle per vendor, shared by all its endpoints; RATE_LIMIT is the vendor's requests per minute
+        self._rate_limit: Optional[int] = getattr(vendor_module, 'RATE_LIMIT', None)
+        self._throttle = Throttle(self._rate_limit) if self._rate_limit else None
+        capabilities = getattr(vendor_module, 'CAPABILITIES', {})
+        ttls = getattr(vendor_module, 'TTL', {})  # endpoint -> how long its responses stay fresh in the disk cache
 
         for func_key, func_value in vendor_module.__dict__.items():
             if func_key == 'authenticate':
                 self._endpoints['auth'] = Endpoint('auth', Getter(func_value), None)
+                self._authorization = Authorization(func_value)
 
             elif func_key.startswith('get'):
                 name = func_key[4:]
@@ -136,11 +387,19 @@ class Vendor:
                 else:
                     formatter = None
 
-                self._endpoints[name] = Endpoint(name, Getter(getter), Formatter(formatter))
+                self._endpoints[name] = Endpoint(
+                    name, Getter(getter), Formatter(formatter), self._throttle, capabilities.get(name, Capability()),
+                    ttls.get(name))
 
     @property
     def name(self): return self._name
 
+    @property
+    def authorization(self) -> Optional[Authorization]: return self._authorization
+
+    @property
+    def rate_limit(self) -> Optional[int]: return self._rate_limit
+
     def __getitem__(self, item):
         return self._endpoints[item]
 
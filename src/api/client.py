@@ -1,15 +1,30 @@
 import json
 import asyncio
+import aiohttp
 from src import config
-from src.api.bases import IO, Query, Data
-from typing import Sequence, Optional
+from src.api import vendors
+from src.api.bases import IO, Query, Data, Catalog, Advisor, Spool, Coverage, Vendor, Template, Logger, Engine, Tape, Cache
+from typing import Sequence, Optional, Callable, Any, Literal
+from dataclasses import replace
 from pathlib import Path
+from pandas import Timestamp, DateOffset
 from contextlib import asynccontextmanager
+from psycopg import errors
 
 
 _DB_POOL: Optional[IO.DBPool] = None
 _HTTP_POOL: Optional[IO.HTTPPool] = None
+_CATALOG = Catalog.Catalog()
+_CATALOG_LISTENER: Optional[asyncio.Task] = None
+_CATALOG_LOCK = asyncio.Lock()
+_SPOOL: Optional[Spool.Spool] = None
+_SPOOL_FLUSHER: Optional[asyncio.Task] = None
+_AUTH_WARMER: Optional[asyncio.Task] = None
+_PARTITION_MAINTAINER: Optional[asyncio.Task] = None
+_COVERAGE = Coverage.Coverage()
 TEMPLATE_DIR = Path(config.PROJECT_ENV['ROOT']) / 'src' / 'api' / 'templates'
+VENDOR_DIR = Vendor.ResourceMap(vendors)
+LOGGER = Logger.logger()
 
 
 async def _connect_to_db(credentials: dict) -> None:
@@ -18,8 +33,49 @@ async def _connect_to_db(credentials: dict) -> None:
 
 
 async def _connect_to_http() -> None:
+    # HTTP_TAPE=<name> (with HTTP_MODE=record|replay) runs the whole stack against a recorded tape
     global _HTTP_POOL
-    _HTTP_POOL = IO.HTTPPool()
+    tape = config.PROJECT_ENV.get('HTTP_TAPE')
+    _HTTP_POOL = Tape.pool(tape, config.PROJECT_ENV.get('HTTP_MODE', 'replay')) if tape else \
+        Cache.CachedPool(IO.HTTPPool())
+
+
+async def use_tape(
+        name: str,
+        mode: Literal['live', 'record', 'replay'] = 'replay',
+        latency: Tape.Latency = 0.
+) -> None:
+    global _HTTP_POOL
+    if _HTTP_POOL is not None:
+        await _HTTP_POOL.close()
+    _HTTP_POOL = Tape.pool(name, mode, latency)
+
+
+def http_pool() -> IO.HTTPPool:
+    # the shared (cached or taped) pool, for callers outside the vendor layer
+    if _HTTP_POOL is None:
+        raise ConnectionError("client is not connected")
+    return _HTTP_POOL
+
+
+async def _start_spool() -> None:
+    global _SPOOL, _SPOOL_FLUSHER
+    if _SPOOL is None:
+        _SPOOL = Spool.Spool()
+    if _SPOOL_FLUSHER is None or _SPOOL_FLUSHER.done():
+        _SPOOL_FLUSHER = asyncio.create_task(Spool.flusher(_SPOOL, _DB_POOL))
+
+
+def _start_auth() -> None:
+    global _AUTH_WARMER
+    if _AUTH_WARMER is None or _AUTH_WARMER.done():
+        _AUTH_WARMER = asyncio.create_task(_warm_authorizations())
+
+
+def _start_partitions() -> None:
+    global _PARTITION_MAINTAINER
+    if _PARTITION_MAINTAINER is None or _PARTITION_MAINTAINER.done():
+        _PARTITION_MAINTAINER = asyncio.create_task(_maintain_registered_partitions())
 
 
 async def connect(password: str, **kwargs) -> True:
@@ -28,10 +84,268 @@ async def connect(password: str, **kwargs) -> True:
     await asyncio.gather(
         _connect_to_db(credentials),
         _connect_to_http())
+    await _start_spool()
+    _start_auth()
+    _start_partitions()
     return True
 
 
+async def ingest(
+        schema: str,
+        table: str,
+        data: Data.Data,
+        keys: Optional[tuple[str, ...]] = None,
+        coverage: tuple[tuple[str, str, str, Timestamp, Timestamp], ...] = (),
+        watermarks: tuple[tuple[str, str, str, str, Timestamp], ...] = ()
+) -> None:
+    # encoding, the segment write and any due fsync happen on a worker thread, off the event loop
+    await asyncio.to_thread(_SPOOL.append, schema, table, data, keys, coverage, watermarks)
+    for vendor, symbol, field, start, end in coverage:
+        _COVERAGE.add(vendor, symbol, field, start, end)
+
+
+async def db_coverage() -> Coverage.Coverage:
+    if not _COVERAGE.loaded:
+        result = await db_transaction(Query.select_coverage())
+        _COVERAGE.load(result.content)
+    return _COVERAGE
+
+
+async def flush() -> int:
+    await asyncio.to_thread(_SPOOL.roll)
+    return await Spool.drain(_SPOOL, _DB_POOL)
+
+
+async def _authorization(vendor: Vendor.Vendor) -> Optional[str]:
+    auth = vendor.authorization
+    return await auth.get(_HTTP_POOL) if auth else None
+
+
+async def _warm_authorizations() -> None:
+    # tokens are fetched once up front and renewed in the background, so fetches find them cached
+    sources = tuple(source for source in VENDOR_DIR if source.authorization)
+    outcomes = await asyncio.gather(*(_authorization(source) for source in sources), return_exceptions=True)
+    for source, outcome in zip(sources, outcomes):
+        if isinstance(outcome, Exception):
+            LOGGER.warning(f'{source.name}: authorization failed: {outcome}')
+
+
+async def vendor_fetch(vendor: str, endpoint: str, **kwargs):
+    source = VENDOR_DIR[vendor]
+    endpoint = source[endpoint]
+    if 'authorization' not in endpoint.signature.parameters:
+        return await endpoint.fetch(_HTTP_POOL, **kwargs)
+    kwargs['authorization'] = await _authorization(source)
+    try:
+        return await endpoint.fetch(_HTTP_POOL, **kwargs)
+    except aiohttp.ClientResponseError as e:
+        # a token revoked before its expiry is replaced once; concurrent 401s share the one refresh
+        if e.status != 401 or not source.authorization:
+            raise
+        kwargs['authorization'] = await source.authorization.refresh(_HTTP_POOL)
+        return await endpoint.fetch(_HTTP_POOL, **kwargs)
+
+
+def _utcnow(like: Optional[Timestamp] = None) -> Timestamp:
+    now = Timestamp.now(tz='UTC')
+    return now.tz_convert(like.tz) if like is not None and like.tz else now.tz_localize(None)
+
+
+def _select(data: Data.Data, names: Optional[Sequence[str]]) -> Data.Data:
+    if not names:
+        return data
+    ix = tuple(i for i, field in enumerate(data.fields) if field.name in names)
+    return Data.Data(fields=tuple(data.fields[i] for i in ix), records=tuple(tuple(rec[i] for i in ix) for rec in data.records))
+
+
+def _ranged(vendor: str, endpoint: str) -> bool:
+    return {'symbol', 'start', 'end'} <= VENDOR_DIR[vendor][endpoint].signature.parameters.keys()
+
+
+def _capability(vendor: str, endpoint: str) -> Vendor.Capability:
+    return VENDOR_DIR[vendor][endpoint].capability
+
+
+def _range_rows(data: Data.Data, symbol: str, time_field: str, start: Timestamp, end: Timestamp) -> Data.Data:
+    names = [field.name for field in data.fields]
+    ix = names.index(time_field)
+    records = tuple(rec for rec in data.records if start <= rec[ix] < end)
+    if 'symbol' in names:
+        return Data.Data(fields=data.fields, records=records)
+    return Data.Data(fields=(Data.Field('symbol', str), *data.fields), records=tuple((symbol, *rec) for rec in records))
+
+
+async def read_through(
+        vendor: str,
+        endpoint: str,
+        symbol: str,
+        fields: tuple[str, ...],
+        start: Timestamp,
+        end: Timestamp,
+        time_field: str = 'datetime',
+        schema: Optional[str] = None,
+        table: Optional[str] = None,
+        **kwargs
+) -> IO.Result:
+    schema, table = schema or vendor, table or endpoint
+    if not _ranged(vendor, endpoint):
+        raise ValueError(f"{vendor}.{endpoint} does not take a symbol and a [start, end) range")
+
+    # a range missing for any requested field is refetched for all of them
+    coverage, gaps = await db_coverage(), Coverage.IntervalSet()
+    for field in fields:
+        for lo, hi in coverage.missing(vendor, symbol, field, start, end):
+            gaps.add(lo, hi)
+
+    async def _fill(lo: Timestamp, hi: Timestamp):
+        data = await vendor_fetch(vendor, endpoint, symbol=symbol, start=lo, end=hi, **kwargs)
+        data = _range_rows(data, symbol, time_field, lo, hi)
+        # never mark the future as stored; bars that have not printed yet are refetched next time
+        hi = min(hi, _utcnow(hi))
+        stored = (f.name for f in data.fields if f.name != 'symbol')
+        await ingest(schema, table, data, keys=('symbol', time_field),
+                     coverage=tuple((vendor, symbol, name, lo, hi) for name in stored if lo < hi))
+
+    await asyncio.gather(*(_fill(lo, hi) for lo, hi in gaps))
+    await flush()
+
+    columns = (Data.Field('symbol', str), Data.Field(time_field, Timestamp), *(Data.Field(f, float) for f in fields))
+    query = Query.select_values(
+        schema=schema, table=table, columns=columns, conditions=(('symbol', '=', symbol),),
+        time_range=(time_field, start, end), order_by=((time_field, 'ASC'),))
+    return await db_transaction(query)
+
+
+async def _fetch_call(call: Engine.Call) -> Data.Data:
+    if not _ranged(call.vendor, call.endpoint):
+        # point-in-time endpoints (quotes) have no range to resume, every run appends a snapshot
+        symbol = list(call.symbol) if isinstance(call.symbol, tuple) else call.symbol
+        data = await vendor_fetch(call.vendor, call.endpoint, symbol=symbol)
+        return _select(data, call.fields and ('symbol', *call.fields))
+    if call.start is None:
+        raise ValueError(f"{call.vendor}.{call.endpoint} needs a start date")
+
+    symbol = list(call.symbol) if isinstance(call.symbol, tuple) else call.symbol
+    kwargs = {'resolution': call.resolution} \
+        if call.resolution is not None and 'resolution' in VENDOR_DIR[call.vendor][call.endpoint].signature.parameters \
+        else {}
+    data = await vendor_fetch(call.vendor, call.endpoint, symbol=symbol, start=call.start, end=call.end, **kwargs)
+    time_field = next(field.name for field in data.fields if field.dtype is Timestamp)
+    data = _select(data, call.fields and ('symbol', time_field, *call.fields))
+    return _range_rows(data, call.symbol, time_field, call.start, call.end)
+
+
+async def _store(template: str, call: Engine.Call, data: Data.Data):
+    if not _ranged(call.vendor, call.endpoint):
+        await ingest(call.vendor, call.endpoint, data)
+        return
+    if not data.records:
+        return
+
+    # resume from the last stored bar so a bar still forming at fetch time is rewritten next run
+    time_field = next(field.name for field in data.fields if field.dtype is Timestamp)
+    names = [field.name for field in data.fields]
+    ix, s = names.index(time_field), names.index('symbol')
+    last = {}
+    for rec in data.records:
+        last[rec[s]] = max(last.get(rec[s], rec[ix]), rec[ix])
+    stored = tuple(name for name in names if name != 'symbol')
+    await ingest(
+        call.vendor, call.endpoint, data, keys=('symbol', time_field),
+        coverage=tuple((call.vendor, symbol, name, call.start, call.end) for symbol in call.symbols for name in stored),
+        watermarks=tuple((template, call.vendor, call.endpoint, symbol, mark) for symbol, mark in last.items()))
+
+
+async def run_template(
+        name: str,
+        incremental: bool = True,
+        limits: Optional[dict[str, int]] = None,
+        progress: Optional[Callable[[Engine.Progress], Any]] = None
+) -> Engine.Report:
+    template = Template.REGISTRY.get(name)
+    calls = template.calls(_utcnow())
+    if incremental:
+        result = await db_transaction(Query.select_watermark(name))
+        marks = {(vendor, endpoint, symbol): mark for vendor, endpoint, symbol, mark in result.content.records}
+        calls = tuple(replace(c, start=marks.get((c.vendor, c.endpoint, c.symbol), c.start)) for c in calls)
+    # windows the coverage index already holds are skipped on incremental runs
+    calls = Engine.batch(calls, _capability, await db_coverage() if incremental else None)
+
+    async def _run(call: Engine.Call) -> Data.Data:
+        data = await _fetch_call(call)
+        await _store(name, call, data)
+        return data
+
+    # failed calls leave their watermark where it was, so the next run picks them up again
+    results, failures = await Engine.execute(calls, _run, limits=limits, progress=progress)
+    for call, e in failures:
+        LOGGER.warning(f'template {name}: {call.vendor}.{call.endpoint}({call.symbol}) failed: {e}')
+    await flush()
+    data = Engine.assemble(results, orientation=template.orientation)
+    return Engine.Report(data=data, results=results, failures=failures)
+
+
+async def fred_observations(
+        series_ids: Sequence[str],
+        incremental: bool = True,
+        schema: str = 'fred',
+        table: str = 'series_observations'
+) -> Data.Data:
+    # each series resumes from its last stored vintage (realtime_start) and its last stored observation date.
+    # the two differ: an observation is dated before its own release, so the vintage mark cannot bound the dates.
+    # revisions to older observations are picked up by a full (incremental=False) refresh
+    marks, dates = {}, {}
+    if incremental:
+        try:
+            vintages, observations = await asyncio.gather(
+                db_transaction(Query.select_latest(schema, table, 'realtime_start', values=series_ids)),
+                db_transaction(Query.select_latest(schema, table, 'date', values=series_ids)))
+            marks, dates = dict(vintages.content.records), dict(observations.content.records)
+        except errors.UndefinedTable:
+            pass
+
+    groups: dict[tuple[Optional[Timestamp], Optional[Timestamp]], list[str]] = {}
+    for series_id in dict.fromkeys(series_ids):
+        groups.setdefault((marks.get(series_id), dates.get(series_id)), []).append(series_id)
+
+    async def _group(mark: Optional[Timestamp], date: Optional[Timestamp], ids: list[str]) -> Data.Data:
+        since = {'start': mark} if mark is not None else {}
+        if date is not None:
+            since['observation_start'] = date
+        return await vendor_fetch('fred', 'series_observations', series_id=ids, **since)
+
+    # every group shares fred's throttle, so thousands of ids stay under its rate limit
+    data = Data.Data.concat(await asyncio.gather(*(_group(*since, ids) for since, ids in groups.items())))
+    if data.records:
+        await ingest(schema, table, data, keys=('symbol', 'date', 'realtime_start'))
+        await flush()
+    return data
+
+
+async def plan_template(name: str, limits: Optional[dict[str, int]] = None) -> Template.Plan:
+    coverage, stats, widths = await asyncio.gather(
+        db_coverage(),
+        db_transaction(Query.table_stats()),
+        db_transaction(Query.table_width()))
+    # the same RATE_LIMIT the vendor's throttle enforces
+    rates = {vendor.name: vendor.rate_limit for vendor in VENDOR_DIR if vendor.rate_limit}
+    return Template.plan(
+        Template.REGISTRY.get(name), coverage=coverage, stats=stats.content, widths=widths.content,
+        rate_limits=rates, limits=limits, ranged=_ranged, now=_utcnow(),
+        batch=lambda calls: Engine.batch(calls, _capability))
+
+
+async def schedule_template(name: str, interval: float = 3600.0):
+    while True:
+        try:
+            await run_template(name)
+        except Exception as e:
+            LOGGER.warning(f'template {name} failed, retrying in {interval}s: {e}')
+        await asyncio.sleep(interval)
+
+
 async def db_transaction(request: IO.DBRequest) -> IO.Result:
+    Advisor.LOG.record(request)
     return await IO.db_transaction(_DB_POOL, request)
 
 
@@ -39,24 +353,142 @@ async def pong() -> bool:
     return all((_DB_POOL.alive, _HTTP_POOL.alive))
 
 
+async def _on_catalog_notify(notify) -> None:
+    event = json.loads(notify.payload)
+    database, schema, table = event['database'], event['schema'], event['table']
+    try:
+        if table is None:
+            result = await db_transaction(Query.snapshot())
+            _CATALOG.load(result.content)
+        elif event['event'] == 'drop':
+            _CATALOG.drop(database, schema, table)
+        else:
+            result = await db_transaction(Query.snapshot(schema=schema, table=table))
+            _CATALOG.refresh(database, schema, table, result.content)
+    except Exception:
+        _CATALOG.clear()  # force a full reload on next access rather than serve a stale catalog
+
+
+async def db_catalog() -> Catalog.Catalog:
+    global _CATALOG_LISTENER
+    async with _CATALOG_LOCK:
+        if _CATALOG_LISTENER is None or _CATALOG_LISTENER.done():
+            _CATALOG.clear()
+            _CATALOG_LISTENER = await _DB_POOL.listen(Query.listen(Catalog.CHANNEL), _on_catalog_notify)
+        if not _CATALOG.loaded:
+            result = await db_transaction(Query.snapshot())
+            _CATALOG.load(result.content)
+    return _CATALOG
+
+
 async def db_snapshot() -> IO.Result:
-    query = Query.snapshot()
-    return await db_transaction(query)
+    catalog = await db_catalog()
+    return IO.Result(catalog.snapshot)
 
 
 async def load_template(name: str) -> dict:
-    with open(TEMPLATE_DIR / f'{name}.json', 'r') as f:
-        return json.load(f)
+    return Template.REGISTRY.get(name).template
 
 
 async def save_template(name: str, template: dict):
-    with open(TEMPLATE_DIR / f'{name}.json', 'w') as f:
-        json.dump(template, f)
+    Template.REGISTRY.put(name, template)
+
+
+async def load_table(
+        name: str,
+        schema: str,
+        columns: Optional[tuple[Data.Field]] = None,
+        time_range: Optional[tuple[str, Optional[Timestamp], Optional[Timestamp]]] = None,
+        order_by: Optional[Query.OrderBy] = None,
+        limit: Optional[int] = None,
+        token: Optional[str] = None
+) -> IO.Result:
+    query = Query.select_values(
+        schema=schema, table=name, columns=columns, time_range=time_range, order_by=order_by, limit=limit, token=token)
+    return await db_transaction(query)
+
+
+async def load_table_parallel(
+        name: str,
+        schema: str,
+        columns: tuple[Data.Field],
+        time_range: tuple[str, Timestamp, Timestamp],
+        symbols: Optional[tuple[str, Sequence[str]]] = None,
+        parallelism: Optional[int] = None
+) -> IO.Result:
+    n = min(parallelism or _DB_POOL.size, _DB_POOL.size)
+    queries = Query.select_partitioned(
+        schema=schema, table=name, columns=columns, time_range=time_range, n=n, symbols=symbols)
+    for query in queries:
+        Advisor.LOG.record(query)
+    return await IO.db_parallel(_DB_POOL, queries, parallelism=n, key=time_range[0])
+
+
+async def maintain_partitions(
+        schema: str,
+        table: str,
+        interval: Query.PartitionInterval = 'month',
+        start: Optional[Timestamp] = None,
+        end: Optional[Timestamp] = None,
+        ahead: int = 3,
+        retain: Optional[int] = None
+) -> None:
+    result = await db_transaction(Query.list_partition(schema=schema, table=table))
+    existing = tuple(name for name, in result.content.records)
+
+    now = Timestamp.now()
+    step = DateOffset(months=1) if interval == 'month' else DateOffset(days=1)
+    requests = Query.create_partitions(
+        schema=schema, table=table, start=start or now, end=end or now + step * (ahead + 1),
+        interval=interval, existing=existing)
+    if retain is not None:
+        requests += Query.detach_partitions(
+            schema=schema, table=table, before=now - step * retain, interval=interval, existing=existing)
+
+    for request in requests:
+        await db_transaction(request)
+    # registered tables are kept ahead by the background maintainer and get partitions on demand at drain time
+    await db_transaction(Query.register_partitions(schema, table, interval, ahead, retain))
+
+
+async def _maintain_registered_partitions(interval: float = 3600.0):
+    while True:
+        try:
+            result = await db_transaction(Query.select_partitions())
+            for schema, table, _, every, ahead, retain in result.content.records:
+                await maintain_partitions(schema, table, interval=every, ahead=ahead, retain=retain)
+        except Exception as e:
+            LOGGER.warning(f'partition maintenance failed, retrying in {interval}s: {e}')
+        await asyncio.sleep(interval)
+
+
+async def advise_indexes(schema: Optional[str] = None, create: bool = False) -> tuple[Advisor.Recommendation, ...]:
+    stats, indexes = await asyncio.gather(
+        db_transaction(Query.table_stats(schema=schema)),
+        db_transaction(Query.list_index_columns(schema=schema)))
+    recommendations = Advisor.advise(stats.content, indexes.content)
+    if create:
+        for recommendation in recommendations:
+            await db_transaction(recommendation.request(concurrently=True))
+    return recommendations
 
 
-async def load_table(name: str, schema: str, columns: Optional[tuple[Data.Field]] = None) -> IO.Result:
-    query = Query.select_values(schema=schema, table=name, columns=columns)
-    return await IO.db_transaction(_DB_POOL, query)
+async def bulk_upsert(
+        schema: str,
+        table: str,
+        data: Data.Data,
+        keys: tuple[str, ...],
+        chunk: int = 50_000
+) -> tuple[int, int]:
+    columns = tuple(field.name for field in data.fields)
+    inserted = updated = 0
+    for i in range(0, data.dims[0], chunk):
+        requests = Query.bulk_upsert(
+            schema=schema, table=table, columns=columns, keys=keys, rows=data.records[i:i + chunk])
+        result = await IO.db_script(_DB_POOL, requests)
+        (ins, upd), = result.content.records
+        inserted, updated = inserted + ins, updated + upd
+    return inserted, updated
 
 
 # def initialize(dbname: str, dbuser: str, dbpass: str, **dbkwargs) -> tuple[Profile, Session, Connection]:
@@ -21,3 +21,85 @@ CREATE TABLE IF NOT EXISTS _meta.fields (
 	vendor varchar REFERENCES _meta.vendors,
 	data_type varchar NOT NULL
 );
+
+/* Time ranges already stored per (vendor, symbol, field); rows are merged on insert so they never overlap */
+CREATE TABLE IF NOT EXISTS _meta.coverage (
+	vendor varchar REFERENCES _meta.vendors,
+	symbol varchar NOT NULL,
+	field varchar NOT NULL,
+	start timestamp NOT NULL,
+	"end" timestamp NOT NULL,
+	CHECK (start < "end")
+);
+
+CREATE INDEX IF NOT EXISTS coverage_vendor_symbol_field_start ON _meta.coverage (vendor, symbol, field, start);
+
+/* High-water mark per template entry and symbol; advanced in the same transaction as the rows it covers */
+CREATE TABLE IF NOT EXISTS _meta.watermarks (
+	template varchar NOT NULL,
+	vendor varchar REFERENCES _meta.vendors,
+	endpoint varchar NOT NULL,
+	symbol varchar NOT NULL,
+	mark timestamp NOT NULL,
+	PRIMARY KEY (template, vendor, endpoint, symbol)
+);
+
+/* Range-partitioned tables kept by client.maintain_partitions; spool drains create the partitions their rows need */
+CREATE TABLE IF NOT EXISTS _meta.partitions (
+	schema varchar NOT NULL,
+	"table" varchar NOT NULL,
+	"interval" varchar NOT NULL CHECK ("interval" IN ('month', 'day')),
+	ahead int NOT NULL DEFAULT 3,
+	retain int,
+	PRIMARY KEY (schema, "table")
+);
+
+/* Session temp schemas (the staging tables behind every bulk upsert and spool drain) never reach the catalog */
+CREATE OR REPLACE FUNCTION _meta.is_temp_schema(name text) RETURNS bool AS $$
+	SELECT name = 'pg_temp' OR name LIKE 'pg\_temp\_%' OR name LIKE 'pg\_toast\_temp\_%';
+$$ LANGUAGE sql IMMUTABLE;
+
+/* Broadcast DDL on the '_meta_catalog' channel so client catalog caches refresh only what changed.
+   Event triggers require superuser. */
+CREATE OR REPLACE FUNCTION _meta.notify_ddl() RETURNS event_trigger AS $$
+DECLARE
+	obj record;
+	names text[];
+BEGIN
+	FOR obj IN SELECT * FROM pg_event_trigger_ddl_commands() LOOP
+		IF obj.object_type IN ('schema', 'table', 'view', 'table column') THEN
+			names := (pg_identify_object_as_address(obj.classid, obj.objid, obj.objsubid)).object_names;
+			CONTINUE WHEN _meta.is_temp_schema(names[1]);
+			PERFORM pg_notify('_meta_catalog', json_build_object(
+				'event', 'alter',
+				'database', current_database(),
+				'schema', names[1],
+				'table', names[2]
+			)::text);
+		END IF;
+	END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION _meta.notify_drop() RETURNS event_trigger AS $$
+DECLARE
+	obj record;
+BEGIN
+	FOR obj IN SELECT * FROM pg_event_trigger_dropped_objects() WHERE original LOOP
+		IF obj.object_type IN ('schema', 'table', 'view') AND NOT _meta.is_temp_schema(obj.address_names[1]) THEN
+			PERFORM pg_notify('_meta_catalog', json_build_object(
+				'event', 'drop',
+				'database', current_database(),
+				'schema', obj.address_names[1],
+				'table', obj.address_names[2]
+			)::text);
+		END IF;
+	END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP EVENT TRIGGER IF EXISTS _meta_notify_ddl;
+CREATE EVENT TRIGGER _meta_notify_ddl ON ddl_command_end EXECUTE FUNCTION _meta.notify_ddl();
+
+DROP EVENT TRIGGER IF EXISTS _meta_notify_drop;
+CREATE EVENT TRIGGER _meta_notify_drop ON sql_drop EXECUTE FUNCTION _meta.notify_drop();
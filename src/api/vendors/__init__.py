@@ -1 +1 @@
-from src.api.vendors import fred, td, ibkr
+from src.api.vendors import fred, td, ibkr, worldbank, figi
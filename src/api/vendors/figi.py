@@ -1,10 +1,47 @@
-import config
-import requests
-from typing import Literal, Optional
-from src.api.bases.Data import Data, Field, Timestamp
+from src import config
+from typing import Optional
+from src.api.bases.Data import Data
+from src.api.bases.Format import Extractor, Spec
+from src.api.bases.IO import HTTPRequest
+from src.api.bases.Vendor import Paginated, Cursor
 
 
-ROOT = 'https://api.openfigi.com'
+# SEE https://www.openfigi.com/api
+ROOT = 'https://api.openfigi.com/v3'
+KEY = config.PROJECT_ENV.get('API_OPENFIGI_KEY')
 DFMT = '%Y-%m-%d'
 
 
+def get_search(query: str, filters: Optional[dict] = None) -> Paginated:
+    headers = {'X-OPENFIGI-APIKEY': KEY} if KEY else None
+    body = {'query': query} | (filters or {})
+    request = HTTPRequest('POST', url=f'{ROOT}/search', headers=headers, json=body)
+    return Paginated(request, Cursor(next=lambda res: res.json().get('next'), param='start'))
+
+
+"""
+FIELD SPECS
+"""
+
+
+SEARCH = Extractor(rows=('data', '*'), specs=(
+    Spec('figi', str),
+    Spec('name', str),
+    Spec('ticker', str),
+    Spec('exchCode', str),
+    Spec('compositeFIGI', str),
+    Spec('securityType', str),
+    Spec('marketSector', str),
+    Spec('shareClassFIGI', str),
+    Spec('securityType2', str),
+    Spec('securityDescription', str),
+))
+
+
+"""
+FORMATTED HTTP GET REQUESTS
+"""
+
+
+def fmt_search(res, params: dict) -> Data:
+    return SEARCH.parse(res)
@@ -1,14 +1,22 @@
 from src import config
-import requests
 from typing import Literal, Optional
-from src.api.bases.Data import Data, Field
-from pandas import Timestamp
+from src.api.bases.Data import Data
+from src.api.bases.Format import Extractor, Spec, timestamp, number
+from src.api.bases.IO import HTTPRequest, HTTPResponse
+from pandas import Timestamp, Timedelta
 
 # DOCS: https://fred.stlouisfed.org/docs/api/fred/
 ROOT = 'https://api.stlouisfed.org/fred'
 DFMT = '%Y-%m-%d'
 DEFAULT_START = Timestamp('1776-07-04')
 DEFAULT_END = Timestamp('9999-12-31')
+RATE_LIMIT = 120  # requests per minute per API key
+TTL = {  # reference endpoints rarely change; their responses are served from the disk cache this long
+    'release': Timedelta(days=1),
+    'release_dates': Timedelta(days=1),
+    'release_series': Timedelta(days=1),
+    'series': Timedelta(days=1),
+}
 
 
 def authenticate() -> str:
@@ -20,7 +28,7 @@ def get_release(
         start: Timestamp = DEFAULT_START,
         end: Timestamp = DEFAULT_END,
         release_id: Optional[int] = None,
-) -> tuple[requests.Response, dict]:
+) -> HTTPRequest:
     if release_id:
         url = f'{ROOT}/release'
         params = {
@@ -38,7 +46,7 @@ def get_release(
             'api_key': authorization,
             'file_type': 'json'
         }
-    return requests.get(url, params=params), params
+    return HTTPRequest('GET', url=url, params=params)
 
 
 def get_release_dates(
@@ -46,7 +54,7 @@ def get_release_dates(
         release_id: int,
         start: Timestamp = DEFAULT_START,
         end: Timestamp = DEFAULT_END,
-) -> tuple[requests.Response, dict]:
+) -> HTTPRequest:
     url = f'{ROOT}/release/dates'
     params = {
         "release_id": release_id,
@@ -55,7 +63,7 @@ def get_release_dates(
         "api_key": authorization,
         "file_type": "json",
     }
-    return requests.get(url, params=params), params
+    return HTTPRequest('GET', url=url, params=params)
 
 
 def get_release_series(
@@ -63,7 +71,7 @@ def get_release_series(
         release_id: int,
         start: Timestamp = DEFAULT_START,
         end: Timestamp = DEFAULT_END,
-) -> tuple[requests.Response, dict]:
+) -> HTTPRequest:
     url = f'{ROOT}/release/series'
     params = {
         "release_id": release_id,
@@ -72,7 +80,7 @@ def get_release_series(
         "api_key": authorization,
         "file_type": "json",
     }
-    return requests.get(url, params=params), params
+    return HTTPRequest('GET', url=url, params=params)
 
 
 def get_series(
@@ -80,7 +88,7 @@ def get_series(
         series_id: str,
         start: Timestamp = DEFAULT_START,
         end: Timestamp = DEFAULT_END,
-) -> tuple[requests.Response, dict]:
+) -> HTTPRequest:
     url = f'{ROOT}/series'
     params = {
         "series_id": series_id,
@@ -89,132 +97,100 @@ def get_series(
         "api_key": authorization,
         "file_type": "json",
     }
-    return requests.get(url, params=params), params
+    return HTTPRequest('GET', url=url, params=params)
 
 
 def get_series_observations(
         authorization: str,
-        series_id: str,
+        series_id: str | list[str],
         start: Timestamp = DEFAULT_START,
         end: Timestamp = DEFAULT_END,
-) -> tuple[requests.Response, dict]:
+        observation_start: Optional[Timestamp] = None,
+) -> HTTPRequest | tuple[HTTPRequest, ...]:
+    # start/end bound the vintages (realtime period); observation_start bounds the observation dates
     url = f'{ROOT}/series/observations'
     params = {
-        "series_id": series_id,
         "realtime_start": start.strftime(DFMT),
         "realtime_end": end.strftime(DFMT),
         "api_key": authorization,
         "file_type": "json",
     }
-    return requests.get(url, params=params), params
-
-
-def fmt_release(res: requests.Response, params: dict) -> Data:
-    fields = (
-        Field(name='id', dtype=int),
-        Field(name="realtime_start", dtype=Timestamp),
-        Field(name="realtime_end", dtype=Timestamp),
-        Field(name='name', dtype=str),
-        Field(name='press_release', dtype=str),
-        Field(name='link', dtype=str),
-        Field(name='notes', dtype=str)
-    )
-
-    records = []
-    for release in res.json()['releases']:
-        record = list(release.values())
-        while len(record) < len(fields):
-            record.append(None)
-        records.append(record)
-
-    return Data(fields=fields, records=records)
-
-
-def fmt_release_dates(res: requests.Response, params: dict) -> Data:
-    fields = (
-        Field(name='date', dtype=Timestamp),
-    )
-
-    records = []
-    for date in res.json()['release_dates']:
-        records.append((Timestamp(date['date'], unit='D'),))
-
-    return Data(fields=fields, records=records)
-
-
-def fmt_release_series(res: requests.Response, params: dict) -> Data:
-    fields = (
-        Field(name='id', dtype=str),
-        Field(name='realtime_start', dtype=Timestamp),
-        Field(name='realtime_end', dtype=Timestamp),
-        Field(name='title', dtype=str),
-        Field(name='observation_start', dtype=Timestamp),
-        Field(name='observation_end', dtype=Timestamp),
-        Field(name='frequency', dtype=str),
-        Field(name='frequency_short', dtype=str),
-        Field(name='units', dtype=str),
-        Field(name='units_short', dtype=str),
-        Field(name='seasonal_adjustment', dtype=str),
-        Field(name='seasonal_adjustment_short', dtype=str),
-        Field(name='last_updated', dtype=Timestamp),
-        Field(name='popularity', dtype=int),
-        Field(name='group_popularity', dtype=int),
-        Field(name="notes", dtype=str),
-    )
-
-    records = []
-    for series in res.json()['seriess']:
-        record = list(series.values())
-        while len(record) < len(fields):
-            record.append(None)
-        records.append(record)
-
-    return Data(fields=fields, records=records)
-
-
-def fmt_series(res: requests.Response, params: dict) -> Data:
-    fields = (
-        Field(name='id', dtype=str),
-        Field(name='realtime_start', dtype=Timestamp),
-        Field(name='realtime_end', dtype=Timestamp),
-        Field(name='title', dtype=str),
-        Field(name='observation_start', dtype=Timestamp),
-        Field(name='observation_end', dtype=Timestamp),
-        Field(name='frequency', dtype=str),
-        Field(name='frequency_short', dtype=str),
-        Field(name='units', dtype=str),
-        Field(name='units_short', dtype=str),
-        Field(name='seasonal_adjustment', dtype=str),
-        Field(name='seasonal_adjustment_short', dtype=str),
-        Field(name='last_updated', dtype=Timestamp),
-        Field(name='popularity', dtype=int),
-        Field(name="notes", dtype=str),
-    )
-
-    records = []
-    for series in res.json()['seriess']:
-        record = list(series.values())
-        while len(record) < len(fields):
-            record.append(None)
-        records.append(record)
-
-    return Data(fields=fields, records=records)
-
-
-def fmt_series_observations(res: requests.Response, params: dict) -> Data:
-    fields = (
-        Field(name='date', dtype=Timestamp),
-        Field(name='realtime_start', dtype=Timestamp),
-        Field(name='realtime_end', dtype=Timestamp),
-        Field(name="value", dtype=float),
-    )
-
-    records = []
-    for observation in res.json()['observations']:
-        record = list(observation.values())
-        while len(record) < len(fields):
-            record.append(None)
-        records.append(record)
-
-    return Data(fields=fields, records=records)
+    if observation_start is not None:
+        params["observation_start"] = observation_start.strftime(DFMT)
+    if isinstance(series_id, str):
+        return HTTPRequest('GET', url=url, params={"series_id": series_id} | params)
+    # there is no multi-series endpoint: one request per id, paced by RATE_LIMIT
+    return tuple(HTTPRequest('GET', url=url, params={"series_id": sid} | params) for sid in dict.fromkeys(series_id))
+
+
+"""
+FIELD SPECS
+"""
+
+
+RELEASE = Extractor(rows=('releases', '*'), specs=(
+    Spec('id', int),
+    Spec('realtime_start', Timestamp, convert=timestamp),
+    Spec('realtime_end', Timestamp, convert=timestamp),
+    Spec('name', str),
+    Spec('press_release', bool),
+    Spec('link', str),
+    Spec('notes', str),
+))
+
+RELEASE_DATES = Extractor(rows=('release_dates', '*'), specs=(
+    Spec('date', Timestamp, convert=timestamp),
+))
+
+SERIES = (
+    Spec('id', str),
+    Spec('realtime_start', Timestamp, convert=timestamp),
+    Spec('realtime_end', Timestamp, convert=timestamp),
+    Spec('title', str),
+    Spec('observation_start', Timestamp, convert=timestamp),
+    Spec('observation_end', Timestamp, convert=timestamp),
+    Spec('frequency', str),
+    Spec('frequency_short', str),
+    Spec('units', str),
+    Spec('units_short', str),
+    Spec('seasonal_adjustment', str),
+    Spec('seasonal_adjustment_short', str),
+    Spec('last_updated', Timestamp, convert=timestamp),
+    Spec('popularity', int),
+)
+
+RELEASE_SERIES = Extractor(rows=('seriess', '*'), specs=(*SERIES, Spec('group_popularity', int), Spec('notes', str)))
+
+SERIES_INFO = Extractor(rows=('seriess', '*'), specs=(*SERIES, Spec('notes', str)))
+
+SERIES_OBSERVATIONS = Extractor(rows=('observations', '*'), typed=True, specs=(
+    Spec('date', Timestamp, convert=timestamp),
+    Spec('realtime_start', Timestamp, convert=timestamp),
+    Spec('realtime_end', Timestamp, convert=timestamp),
+    Spec('value', float, convert=number),
+))
+
+
+"""
+FORMATTED HTTP GET REQUESTS
+"""
+
+
+def fmt_release(res: HTTPResponse, params: dict) -> Data:
+    return RELEASE.parse(res)
+
+
+def fmt_release_dates(res: HTTPResponse, params: dict) -> Data:
+    return RELEASE_DATES.parse(res)
+
+
+def fmt_release_series(res: HTTPResponse, params: dict) -> Data:
+    return RELEASE_SERIES.parse(res)
+
+
+def fmt_series(res: HTTPResponse, params: dict) -> Data:
+    return SERIES_INFO.parse(res)
+
 
+def fmt_series_observations(res: HTTPResponse, params: dict) -> Data:
+    return SERIES_OBSERVATIONS.parse(res, symbol=params['series_id'])
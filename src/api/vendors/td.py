@@ -1,8 +1,10 @@
 from src import config
-import requests
-from typing import Literal, Optional, Callable
-from src.api.bases.Data import Data, Field, Timestamp
-from src.api.bases.IO import HTTPRequest
+from typing import Literal, Optional, Callable, Sequence
+from src.api.bases.Data import Data, Timestamp
+from src.api.bases.Format import Extractor, Spec, epoch_ms, timestamp
+from src.api.bases.IO import HTTPRequest, HTTPResponse
+from src.api.bases.Vendor import Capability
+from pandas import Timedelta
 
 
 # AUTH: https://developer.tdameritrade.com/content/simple-auth-local-apps
@@ -12,6 +14,21 @@ CLIENT_ID = KEY + '@AMER.OAUTHAP'
 DFMT = '%Y-%m-%d'
 DTFMT = '%Y-%m-%dT%H:%M:%S%z'
 DTUNIT = 'ms'
+BATCH = 500  # symbols per comma-separated quote/instrument request
+MINUTE_SPAN = Timedelta(days=10)  # intraday history is served in windows of at most this much
+FREQUENCIES = {  # bar size -> (periodType, frequencyType, frequency)
+    **{Timedelta(minutes=m): ('day', 'minute', m) for m in (1, 5, 10, 15, 30)},
+    Timedelta(days=1): ('year', 'daily', 1),
+    Timedelta(weeks=1): ('year', 'weekly', 1),
+}
+TTL = {'instrument': Timedelta(days=1)}  # fundamentals and symbol lookups change at most daily
+CAPABILITIES = {
+    'instrument': Capability(symbols=BATCH),
+    'quote': Capability(symbols=BATCH),
+    'price_history': Capability(
+        span={None: MINUTE_SPAN, **{r: MINUTE_SPAN for r, (_, kind, _) in FREQUENCIES.items() if kind == 'minute'}},
+        resolutions=tuple(FREQUENCIES)),
+}
 
 
 """
@@ -19,22 +36,25 @@ UTILITY FUNCTIONS
 """
 
 
+def _batches(symbol: str | Sequence[str], size: int = BATCH) -> tuple[str, ...]:
+    symbols = [symbol] if isinstance(symbol, str) else list(dict.fromkeys(symbol))
+    return tuple(','.join(symbols[i:i + size]) for i in range(0, len(symbols), size))
+
+
 def authenticate() -> tuple[HTTPRequest, Callable]:
     url = 'https://api.tdameritrade.com/v1/oauth2/token'
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
     data = {
         "grant_type": "refresh_token",
         "refresh_token": REFRESH_TOKEN,
         "client_id": CLIENT_ID,
     }
+    request = HTTPRequest('POST', url=url, data=data)
 
-    res = requests.post(url, headers=headers, data=data)
-    res = HTTPRequest('POST', url=url, headers=headers, params=data)
-
-    def token(response):
-        return response.json()['access_token']
+    def token(response: HTTPResponse) -> tuple[str, int]:
+        payload = response.json()
+        return payload['access_token'], payload['expires_in']
 
-    return res, token
+    return request, token
 
 
 """
@@ -44,13 +64,16 @@ RAW HTTP GET REQUESTS
 
 def get_instrument(
         authorization: str,
-        symbol: str,
+        symbol: str | list[str],
         projection: Literal['symbol-search', 'symbol-regex', 'desc-search', 'desc-regex', 'fundamental'] = 'symbol-search'
-) -> HTTPRequest:
+) -> tuple[HTTPRequest, ...]:
     url = f'https://api.tdameritrade.com/v1/instruments'
     headers = {'Authorization': f'Bearer {authorization}'}
-    params = {'symbol': symbol, 'projection': projection}
-    return HTTPRequest(url=url, headers=headers, params=params)
+    if projection not in ('symbol-search', 'fundamental'):
+        return HTTPRequest(url=url, headers=headers, params={'symbol': symbol, 'projection': projection}),
+    return tuple(
+        HTTPRequest(url=url, headers=headers, params={'symbol': batch, 'projection': projection})
+        for batch in _batches(symbol))
 
 
 def get_market_hours(
@@ -109,11 +132,14 @@ def get_price_history(
         period: int = 1,
         frequency_type: Literal['minute', 'daily', 'weekly', 'monthly'] = 'minute',
         frequency: int = 1,
-        end_date: Optional[Timestamp] = None,
-        start_date: Optional[Timestamp] = None,
+        start: Optional[Timestamp] = None,
+        end: Optional[Timestamp] = None,
+        resolution: Optional[Timedelta] = None,
 ) -> HTTPRequest:
     url = f'https://api.tdameritrade.com/v1/marketdata/{symbol}/pricehistory'
     headers = {'Authorization': f'Bearer {authorization}'}
+    if resolution is not None:
+        period_type, frequency_type, frequency = FREQUENCIES[resolution]
     params = {
         'periodType': period_type,
         'period': period,
@@ -121,23 +147,104 @@ def get_price_history(
         'frequency': frequency,
     }
 
-    if end_date is not None:
-        params['endDate'] = end_date.strftime(DFMT)
+    # explicit bounds are epoch milliseconds and take precedence over period
+    if start is not None:
+        params['startDate'] = int(start.timestamp() * 1000)
+        del params['period']
 
-    if start_date is not None:
-        params['startDate'] = start_date.strftime(DFMT)
+    if end is not None:
+        params['endDate'] = int(end.timestamp() * 1000)
 
     return HTTPRequest(url=url, headers=headers, params=params)
 
 
 def get_quote(
         authorization: str,
-        symbol: str,
-) -> HTTPRequest:
+        symbol: str | list[str],
+) -> tuple[HTTPRequest, ...]:
     url = f'https://api.tdameritrade.com/v1/marketdata/quotes'
     headers = {'Authorization': f'Bearer {authorization}'}
-    params = {'symbol': symbol}
-    return HTTPRequest(url=url, headers=headers, params=params)
+    return tuple(HTTPRequest(url=url, headers=headers, params={'symbol': batch}) for batch in _batches(symbol))
+
+
+"""
+FIELD SPECS
+"""
+
+
+INSTRUMENT = Extractor(rows=('*',), specs=(
+    Spec('cusip', str),
+    Spec('symbol', str),
+    Spec('description', str),
+    Spec('exchange', str),
+    Spec('assetType', str),
+))
+
+FUNDAMENTAL = Extractor(rows=('*', 'fundamental'), specs=(
+    Spec('symbol', str),
+    Spec('dividendAmount', float),
+    Spec('dividendDate', Timestamp, convert=timestamp),
+    Spec('dividendPayDate', Timestamp, convert=timestamp),
+    Spec('sharesOutstanding', float),
+    Spec('marketCap', float),
+    Spec('marketCapFloat', float),
+    Spec('beta', float),
+))
+
+MARKET_HOURS = Extractor(rows=('*',), specs=(
+    Spec('date', Timestamp, convert=timestamp),
+    Spec('marketType', str),
+    Spec('exchange', str),
+    Spec('isOpen', bool),
+    Spec('preMarketStart', Timestamp, ('sessionHours', 'preMarket', 0, 'start'), timestamp),
+    Spec('preMarketEnd', Timestamp, ('sessionHours', 'preMarket', 0, 'end'), timestamp),
+    Spec('regularMarketStart', Timestamp, ('sessionHours', 'regularMarket', 0, 'start'), timestamp),
+    Spec('regularMarketEnd', Timestamp, ('sessionHours', 'regularMarket', 0, 'end'), timestamp),
+    Spec('postMarketStart', Timestamp, ('sessionHours', 'postMarket', 0, 'start'), timestamp),
+    Spec('postMarketEnd', Timestamp, ('sessionHours', 'postMarket', 0, 'end'), timestamp),
+))
+
+# one contract per side of each expiry/strike, calls and puts alike
+OPTION_CHAIN = Extractor(rows=('*', '*', '*', 0), specs=(
+    Spec('putCall', str),
+    Spec('symbol', str),
+    Spec('bid', float),
+    Spec('ask', float),
+    Spec('mark', float),
+    Spec('bidSize', int),
+    Spec('askSize', int),
+    Spec('tradeTimeInLong', Timestamp, convert=epoch_ms),
+    Spec('quoteTimeInLong', Timestamp, convert=epoch_ms),
+    Spec('volatility', float),
+    Spec('delta', float),
+    Spec('gamma', float),
+    Spec('theta', float),
+    Spec('vega', float),
+    Spec('rho', float),
+    Spec('openInterest', int),
+    Spec('strikePrice', float),
+    Spec('expirationDate', Timestamp, convert=epoch_ms),
+    Spec('multiplier', int),
+))
+
+PRICE_HISTORY = Extractor(rows=('candles', '*'), typed=True, specs=(
+    Spec('open', float),
+    Spec('high', float),
+    Spec('low', float),
+    Spec('close', float),
+    Spec('volume', int),
+    Spec('datetime', Timestamp, convert=epoch_ms),
+))
+
+QUOTE = Extractor(rows=('*',), specs=(
+    Spec('symbol', str),
+    Spec('bidPrice', float),
+    Spec('askPrice', float),
+    Spec('bidSize', int),
+    Spec('askSize', int),
+    Spec('quoteTimeInLong', Timestamp, convert=epoch_ms),
+    Spec('tradeTimeInLong', Timestamp, convert=epoch_ms),
+))
 
 
 """
@@ -145,165 +252,28 @@ FORMATTED HTTP GET REQUESTS
 """
 
 
-def fmt_instrument(res: requests.Response, params: dict) -> Data:
+def fmt_instrument(res: HTTPResponse, params: dict) -> Data:
     match params['projection']:
         case 'symbol-search' | 'symbol-regex' | 'desc-search' | 'desc-regex':
-            fields = (
-                Field('cusip', str),
-                Field('symbol', str),
-                Field('description', str),
-                Field('exchange', str),
-                Field('assetType', str)
-            )
-            records = tuple(tuple(d.values()) for d in res.json().values())
-
+            return INSTRUMENT.parse(res)
         case 'fundamental':
-            fields = (
-                Field('symbol', str),
-                Field('dividendAmount', float),
-                Field('dividendDate', Timestamp),
-                Field('dividendPayDate', Timestamp),
-                Field('sharesOutstanding', float),
-                Field('marketCap', float),
-                Field('marketCapFloat', float),
-                Field('beta', float)
-            )
-            res = res.json()[params['symbol']]['fundamental']
-            records = tuple()
-            for field in fields:
-                if field.dtype == Timestamp:
-                    records += (Timestamp(res[field.name], unit=DTUNIT),)
-                else:
-                    records += (res[field.name],)
-
+            return FUNDAMENTAL.parse(res)
         case _:
             raise ValueError(f'Invalid projection: {params["projection"]}')
 
-    return Data(fields=fields, records=records)
-
-
-def fmt_market_hours(res: requests.Response, params: dict) -> Data:
-    _, outer = res.json()[params['markets'].lower()].popitem()
-    inner = outer.pop('sessionHours')
-
-    fields = (
-        Field('date', Timestamp),
-        Field('marketType', str),
-        Field('exchange', str),
-        Field('isOpen', bool),
-        Field('preMarketStart', Timestamp),
-        Field('preMarketEnd', Timestamp),
-        Field('regularMarketStart', Timestamp),
-        Field('regularMarketEnd', Timestamp),
-        Field('postMarketStart', Timestamp),
-        Field('postMarketEnd', Timestamp),
-    )
-
-    records = ((
-        Timestamp(outer['date']),
-        outer['marketType'],
-        outer['exchange'],
-        outer['isOpen'],
-        Timestamp(inner['preMarket'][0]['start']),
-        Timestamp(inner['preMarket'][0]['end']),
-        Timestamp(inner['regularMarket'][0]['start']),
-        Timestamp(inner['regularMarket'][0]['end']),
-        Timestamp(inner['postMarket'][0]['start']),
-        Timestamp(inner['postMarket'][0]['end'])
-    ),)
-
-    return Data(fields=fields, records=records)
-
-
-def fmt_option_chain(res: requests.Response) -> Data:
-    calls = res.json()['callExpDateMap']
-    puts = res.json()['putExpDateMap']
-    expiries = tuple(calls.keys())
-    strikes = tuple(_.keys() for _ in calls.values())
-
-    data = tuple()
-    fields = (
-        Field('putCall', str),
-        Field('symbol', str),
-        Field('bid', float),
-        Field('ask', float),
-        Field('mark', float),
-        Field('bidSize', int),
-        Field('askSize', int),
-        Field('tradeTimeInLong', Timestamp),
-        Field('quoteTimeInLong', Timestamp),
-        Field('volatility', float),
-        Field('delta', float),
-        Field('gamma', float),
-        Field('theta', float),
-        Field('vega', float),
-        Field('rho', float),
-        Field('openInterest', int),
-        Field('strikePrice', float),
-        Field('expirationDate', Timestamp),
-        Field('multiplier', int),
-    )
-
-    for strike, expiry in zip(strikes, expiries):
-        for K in strike:
-            c = tuple()
-            p = tuple()
-            for field in fields:
-                if field.dtype == Timestamp:
-                    c += (Timestamp(calls[expiry][K][0][field.name], unit=DTUNIT),)
-                    p += (Timestamp(puts[expiry][K][0][field.name], unit=DTUNIT),)
-                else:
-                    c += (calls[expiry][K][0][field.name],)
-                    p += (puts[expiry][K][0][field.name],)
-            data += (c,)
-            data += (p,)
-
-    return Data(fields=fields, records=data)
-
-
-def fmt_price_history(res: requests.Response) -> Data:
-    fields = (
-        Field('open', float),
-        Field('high', float),
-        Field('low', float),
-        Field('close', float),
-        Field('volume', int),
-        Field('datetime', Timestamp),
-    )
-
-    records = tuple()
-    for bar in res.json()['candles']:
-        records += (
-            bar['open'],
-            bar['high'],
-            bar['low'],
-            bar['close'],
-            bar['volume'],
-            Timestamp(bar['datetime'], unit=DTUNIT),
-        ),
-
-    return Data(fields=fields, records=records)
-
-
-def fmt_quote(res: requests.Response) -> Data:
-    _, data = res.json().popitem()
-    return Data(
-        fields=(
-            Field('symbol', str),
-            Field('bidPrice', float),
-            Field('askPrice', float),
-            Field('bidSize', int),
-            Field('askSize', int),
-            Field('quoteTimeInLong', Timestamp),
-            Field('tradeTimeInLong', Timestamp),
-        ),
-        records=((
-            data['symbol'],
-            data['bidPrice'],
-            data['askPrice'],
-            data['bidSize'],
-            data['askSize'],
-            Timestamp(data['quoteTimeInLong'], unit=DTUNIT),
-            Timestamp(data['tradeTimeInLong'], unit=DTUNIT),
-        ),)
-    )
+
+def fmt_market_hours(res: HTTPResponse, params: dict) -> Data:
+    return MARKET_HOURS(res.json()[params['markets'].lower()])
+
+
+def fmt_option_chain(res: HTTPResponse, params: dict) -> Data:
+    payload = res.json()
+    return OPTION_CHAIN((payload['callExpDateMap'], payload['putExpDateMap']))
+
+
+def fmt_price_history(res: HTTPResponse, params: dict) -> Data:
+    return PRICE_HISTORY.parse(res)
+
+
+def fmt_quote(res: HTTPResponse, params: dict) -> Data:
+    return QUOTE.parse(res)
@@ -1,59 +1,54 @@
 # SEE https://datahelpdesk.worldbank.org/knowledgebase/articles/1886686-advanced-data-api-queries
 
-import requests
-from api.bases.Data import Blob
+from src.api.bases.Data import Data, Timestamp
+from src.api.bases.Format import Extractor, Spec, timestamp
+from src.api.bases.IO import HTTPRequest
+from src.api.bases.Vendor import Paginated, Pages
 
 
 ROOT = "http://api.worldbank.org/v2"
+PER_PAGE = 10000
 
 
-def get(sources: int = 2, country: str = 'USA', series: str = 'SP.POP.TOTL', time: str = 'all', page: int = 1) -> Blob:
-    url = make_url(sources, country, series, time, page)
-    response = requests.get(url)
-    pages, response = process(response)
+def get_data(
+        symbol: str = 'USA',
+        field: str = 'SP.POP.TOTL',
+        sources: int = 2,
+        time: str = 'all'
+) -> Paginated:
+    url = f'{ROOT}/sources/{sources}/country/{symbol}/series/{field}/time/{time}/data'
+    params = {'format': 'json', 'per_page': PER_PAGE}
+    return Paginated(HTTPRequest('GET', url=url, params=params), Pages(count=lambda res: res.json()['pages']))
 
-    if pages == 0:
-        raise Exception(response)
 
-    while page < pages:
-        page += 1
-        temp = get(sources, country, series, time, page)
-        response.extend(temp)
+"""
+FIELD SPECS
+"""
 
-    return response
 
+DATA = Extractor(specs=(
+    Spec('country', str),
+    Spec('series', str),
+    Spec('time', Timestamp, convert=timestamp),
+    Spec('value', float),
+))
 
-def make_url(sources: int, country: str, series: str, time: str, page: int) -> str:
-    url = ROOT
-    url += f'/sources/{sources}'
-    url += f'/country/{country}'
-    url += f'/series/{series}'
-    url += f'/time/{time}'
-    url += '/data'
-    url += '?format=json'
-    url += '&per_page=10000'
-    url += f'&page={page}'
-    return url
 
+"""
+FORMATTED HTTP GET REQUESTS
+"""
 
-def process(response: requests.Response) -> tuple[int, str | Blob]:
-    if not response.ok:
-        return 0, f'{response.status_code}: {response.text}'
-    else:
-        return fmt(response)
 
+def _row(d: dict) -> dict:
+    # each datum names its dimensions in a 'variable' list of {concept, id, value}
+    concepts = {var['concept']: var for var in d['variable']}
+    return {
+        'country': concepts['Country']['id'],
+        'series': concepts['Series']['id'],
+        'time': concepts['Time']['value'],
+        'value': d['value'],
+    }
 
-def fmt(response: requests.Response) -> tuple[int, Blob]:
-    j = response.json()
-    pages, data = j['pages'], j['source']['data']
 
-    def row(d: dict) -> tuple:
-        temp = {}
-        while var := d['variable']:
-            _ = var.pop()
-            temp[_['concept']] = _['id'], _['value']
-        return temp['Country'][0], temp['Series'][0], temp['Time'][1], d['value']
-
-    cols = ('country', 'series', 'time', 'value')
-    data = [row(_) for _ in data]
-    return pages, Blob(cols=cols, data=data)
+def fmt_data(res, params: dict) -> Data:
+    return DATA([_row(d) for d in res.json()['source']['data']])
@@ -1,12 +1,27 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from rich.segment import Segment
+from rich.style import Style
 from textual.app import ComposeResult
-from textual.widgets import Tree, DataTable, Static
+from textual.geometry import Size
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from textual.widgets import Tree, Static
+from textual.widgets.tree import TreeNode
 from textual.message import Message
+from textual.worker import Worker, get_current_worker
+from src.api import client
 from src.api.bases import IO, Query
-from typing import Optional, Callable
+from src.api.bases.Catalog import Catalog
+from src.api.bases.Data import Field
+from typing import Optional, Callable, Literal
 
 
 IX = 2
 SYMBOL = ":database:"
+CHUNK = 250
+DB_EXCLUDE = ("postgres", "template0", "template1")
+SCHEMA_EXCLUDE = ("public", "information_schema", "pg_catalog", "pg_toast")
 
 
 class Request(Message):
@@ -16,8 +31,134 @@ class Request(Message):
         self.callback = callback
 
 
-class DataView(DataTable):
-    ...
+class DataView(ScrollView):
+    PAGE = 100
+    MARGIN = 1
+    CACHE = 8
+    WIDTH = 16
+
+    def __init__(self):
+        super().__init__()
+        self._schema: Optional[str] = None
+        self._table: Optional[str] = None
+        self._columns: tuple[Field, ...] = ()
+        self._key: tuple[str, ...] = ()
+        self._rows = 0
+        self._bounds: dict[int, Optional[tuple]] = {}
+        self._pages: OrderedDict[int, tuple[tuple, ...]] = OrderedDict()
+        self._pending: dict[int, Worker] = {}
+
+    async def load(self, database: str, schema: str, table: str):
+        for worker in self._pending.values():
+            worker.cancel()
+        self._pending.clear()
+        self._pages.clear()
+
+        columns = await client.db_transaction(Query.list_column(database, schema, table))
+        key = await client.db_transaction(Query.list_key(schema, table))
+        rows = await client.db_transaction(Query.count_estimate(schema, table))
+
+        self._schema, self._table = schema, table
+        self._columns = tuple(Field(name=name, dtype=str) for name, _, _ in columns.content.records)
+        self._key = tuple(name for name, in key.content.records)
+        if not self._key:
+            # no primary key: walk the first timestamp column, tie-broken by physical row id
+            ts = [name for name, typ, _ in columns.content.records if typ.startswith(('timestamp', 'date'))]
+            self._key = (*ts[:1], 'ctid')
+        self._rows = max(rows.content.records[0][0], 0) if rows.content.records else 0
+        self._bounds = {0: None}
+
+        self.virtual_size = Size(self.WIDTH * len(self._columns), self._rows + 1)
+        self.scroll_to(0, 0, animate=False)
+        self._request_window()
+        self.refresh()
+
+    def _request_window(self):
+        if not self._columns:
+            return
+
+        first = self.scroll_offset.y // self.PAGE
+        last = (self.scroll_offset.y + self.size.height) // self.PAGE
+        wanted = range(max(first - self.MARGIN, 0), last + self.MARGIN + 1)
+
+        for page in tuple(self._pending):
+            if page not in wanted:
+                self._pending.pop(page).cancel()
+
+        for page in wanted:
+            if page in self._pages or page in self._pending or page * self.PAGE > self._rows:
+                continue
+            self._pending[page] = self.run_worker(self._fetch(page), group='pages', exit_on_error=False)
+
+    async def _bound(self, page: int) -> Optional[tuple]:
+        if page in self._bounds:
+            return self._bounds[page]
+
+        known = max(p for p in self._bounds if p < page)
+        request = Query.select_bounds(self._schema, self._table, self._key, self._bounds[known], self.PAGE, page - known)
+        result = await client.db_transaction(request)
+        for ix, bound in enumerate(result.content.records, start=known + 1):
+            self._bounds[ix] = bound
+        return self._bounds.get(page)
+
+    async def _fetch(self, page: int):
+        worker = get_current_worker()
+        try:
+            after = await self._bound(page)
+            if page and after is None:
+                return
+            request, key_ix = Query.select_page(self._schema, self._table, self._columns, self._key, after, self.PAGE)
+            records = (await client.db_transaction(request)).content.records
+        finally:
+            if self._pending.get(page) is worker:
+                del self._pending[page]
+
+        self._pages[page] = records
+        while len(self._pages) > self.CACHE:
+            self._pages.popitem(last=False)
+
+        if records:
+            self._bounds[page + 1] = tuple(records[-1][ix] for ix in key_ix)
+        if len(records) < self.PAGE:
+            self._rows = page * self.PAGE + len(records)
+        elif (page + 1) * self.PAGE >= self._rows:
+            self._rows = (page + 1) * self.PAGE + 1  # estimate ran short; keep scrolling open
+        self.virtual_size = Size(self.virtual_size.width, self._rows + 1)
+        self.refresh()
+
+    def _cell(self, value) -> str:
+        text = '' if value is None else str(value)
+        return text[:self.WIDTH - 1].ljust(self.WIDTH)
+
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        if y == 0:
+            text, style = ''.join(self._cell(col.name) for col in self._columns), Style(bold=True)
+        else:
+            row = scroll_y + y - 1
+            page, ix = divmod(row, self.PAGE)
+            if row >= self._rows:
+                text, style = '', Style()
+            elif (records := self._pages.get(page)) is not None and ix < len(records):
+                self._pages.move_to_end(page)
+                text, style = ''.join(self._cell(val) for val in records[ix][:len(self._columns)]), Style()
+            else:
+                text, style = '...', Style(dim=True)
+        return Strip([Segment(text, style)]).crop(scroll_x, scroll_x + self.size.width)
+
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        super().watch_scroll_y(old_value, new_value)
+        self._request_window()
+
+    def on_resize(self):
+        self._request_window()
+
+
+@dataclass
+class NodeData:
+    kind: Literal['database', 'schema', 'table']
+    path: tuple[str, ...]
+    loaded: bool = False
 
 
 class DataTree(Tree):
@@ -25,21 +166,53 @@ class DataTree(Tree):
         super().__init__("/")
         self.show_root = False
         self.guide_depth = 2
+        self._catalog: Optional[Catalog] = None
 
     async def init(self):
-        request = Query.snapshot()
-        request = Request(request)
-        request.callback = self.populate_tree
-        self.post_message(request)
-
-    async def populate_tree(self, result: IO.Result):
-        df = result.content.df
-        db_li = df['database'].unique()
-        for db in db_li:
-            db_node = self.root.add(db, expand=True)
-            sch_li = df[df['database']==db]['schema'].unique()
-            for sch in sch_li:
-                sch_node = db_node.add(sch, expand=True)
-                tbl_li = df[(df['database']==db) & (df['schema']==sch)]['table'].unique()
-                for tbl in tbl_li:
-                    sch_node.add_leaf(tbl)
+        # levels come from the client's catalog cache, which only describes the connected database
+        self.root.remove_children()
+        self._catalog = await client.db_catalog()
+        self.populate_node(self.root)
+
+    def _children(self, node: TreeNode) -> tuple[str, tuple[str, ...], list[str]]:
+        if node is self.root:
+            names = (db.name for db in self._catalog.databases() if db.name not in DB_EXCLUDE)
+            return 'database', (), sorted(names)
+        path = node.data.path
+        if node.data.kind == 'database':
+            names = (sch.name for sch in self._catalog.schemas(*path) if sch.name not in SCHEMA_EXCLUDE)
+            return 'schema', path, sorted(names)
+        return 'table', path, sorted(tbl.name for tbl in self._catalog.tables(*path))
+
+    def populate_node(self, node: TreeNode):
+        kind, path, names = self._children(node)
+        if node.data:
+            node.data.loaded = True
+        self._add_chunk(node, kind, path, names, 0)
+
+    def _add_chunk(self, node: TreeNode, kind: str, path: tuple[str, ...], names: list[str], ix: int):
+        # attach siblings a chunk per refresh so very wide schemas never block the UI
+        for name in names[ix:ix + CHUNK]:
+            data = NodeData(kind=kind, path=(*path, name))
+            if kind == 'table':
+                node.add_leaf(name, data=data)
+            else:
+                node.add(name, data=data)
+        if ix + CHUNK < len(names):
+            self.call_after_refresh(self._add_chunk, node, kind, path, names, ix + CHUNK)
+
+    class TableSelected(Message):
+        def __init__(self, database: str, schema: str, table: str):
+            super().__init__()
+            self.database = database
+            self.schema = schema
+            self.table = table
+
+    def on_tree_node_selected(self, event: Tree.NodeSelected):
+        if event.node.data and event.node.data.kind == 'table':
+            self.post_message(self.TableSelected(*event.node.data.path))
+
+    def on_tree_node_expanded(self, event: Tree.NodeExpanded):
+        node = event.node
+        if node.data and not node.data.loaded and node.data.kind != 'table':
+            self.populate_node(node)
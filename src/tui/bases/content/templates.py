@@ -55,7 +55,7 @@ class TemplateTab(Container):
         if selected:
             label = self.query_one(Label)
             label.update(selected)
-            template = Template.get_template(selected)
+            template = Template.REGISTRY.get(selected).template
             text = json.dumps(template, indent=4)
             text_area.load_text(text)
         else:
@@ -73,7 +73,7 @@ class TemplateTab(Container):
     def save_template(self):
         text_area = self.query_one(TextArea)
         template = json.loads(text_area.text)
-        Template.put_template(self.selected, template)
+        Template.REGISTRY.put(self.selected, template)
 
     @on(TemplateButtonReset.Pressed)
     def reset_template(self):
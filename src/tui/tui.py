@@ -36,6 +36,7 @@ class HedgePyApp(App):
         with TabbedContent(id="ContentArea"):
             with TabPane("database"):
                 yield content.data.DataTree()
+                yield content.data.DataView()
             with TabPane("templates"):
                 yield content.templates.TemplateTab()
         yield Footer()
@@ -55,6 +56,9 @@ class HedgePyApp(App):
         )
         await self.query_one(content.data.DataTree).init()
 
+    async def on_data_tree_table_selected(self, message: content.data.DataTree.TableSelected):
+        await self.query_one(content.data.DataView).load(message.database, message.schema, message.table)
+
     @work
     async def db_transaction(self, request: IO.DBRequest) -> IO.Result:
         return await client.db_transaction(request)
@@ -0,0 +1,79 @@
+import sys
+import json
+import random
+import timeit
+from pathlib import Path
+from typing import Callable
+from src.api.bases import Json
+from src.api.bases.IO import HTTPResponse
+from src.api.vendors import td
+
+
+"""
+SYNTHETIC PAYLOADS (used when no recorded response is given)
+"""
+
+
+def price_history_payload(n: int = 10_000) -> dict:
+    t0 = 1_600_000_000_000
+    return {'symbol': 'AAPL', 'empty': False, 'candles': [
+        {'open': 100 + i * .01, 'high': 101 + i * .01, 'low': 99 + i * .01, 'close': 100.5 + i * .01,
+         'volume': random.randint(0, 10 ** 6), 'datetime': t0 + i * 60_000}
+        for i in range(n)
+    ]}
+
+
+def option_chain_payload(expiries: int = 20, strikes: int = 100) -> dict:
+    t0 = 1_600_000_000_000
+
+    def contract(side: str, expiry: int, strike: float) -> dict:
+        return {
+            'putCall': side, 'symbol': f'AAPL_{expiry}{side[0]}{strike}', 'bid': 1.0, 'ask': 1.1, 'mark': 1.05,
+            'bidSize': 10, 'askSize': 12, 'tradeTimeInLong': t0, 'quoteTimeInLong': t0, 'volatility': 25.0,
+            'delta': .5, 'gamma': .01, 'theta': -.02, 'vega': .1, 'rho': .01, 'openInterest': 100,
+            'strikePrice': strike, 'expirationDate': t0 + expiry * 86_400_000, 'multiplier': 100,
+        }
+
+    def side(name: str) -> dict:
+        return {
+            f'2024-01-{e + 1:02d}:{e}': {f'{100 + k * .5:.1f}': [contract(name, e, 100 + k * .5)] for k in range(strikes)}
+            for e in range(expiries)
+        }
+
+    return {'symbol': 'AAPL', 'callExpDateMap': side('CALL'), 'putExpDateMap': side('PUT')}
+
+
+PAYLOADS = {
+    'price_history': (td.fmt_price_history, price_history_payload),
+    'option_chain': (td.fmt_option_chain, option_chain_payload),
+}
+
+
+def _ms(fn: Callable, number: int) -> float:
+    return min(timeit.repeat(fn, number=1, repeat=number)) * 1000
+
+
+def bench(formatter: Callable, body: bytes, number: int = 20) -> tuple[float, float, float]:
+    # stdlib parse as the baseline, then the formatter end to end (its own decoder included)
+    stdlib = _ms(lambda: json.loads(body), number)
+    total = _ms(lambda: formatter(HTTPResponse(200, {}, body), {}), number)
+    parsed = HTTPResponse(200, {}, body)
+    formatter(parsed, {})  # the response caches its decode, so this timing isolates the formatter
+    fmt = _ms(lambda: formatter(parsed, {}), number)
+    return stdlib, total - fmt, fmt
+
+
+def main(argv: list[str]):
+    # python -m src.utils.bench [endpoint] [recorded_response.json]
+    names = argv[:1] or list(PAYLOADS)
+    print(f'json backend: {Json.BACKEND}')
+    for name in names:
+        formatter, synthetic = PAYLOADS[name]
+        body = Path(argv[1]).read_bytes() if len(argv) > 1 else json.dumps(synthetic()).encode()
+        stdlib, parse, fmt = bench(formatter, body)
+        print(f'td.fmt_{name} ({len(body) / 1e6:.1f} MB): stdlib parse {stdlib:.1f} ms, '
+              f'parse {parse:.1f} ms, format {fmt:.1f} ms')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,10 +1,15 @@
 import os
 import json
 import time
+import asyncio
 import requests
 import pandas as pd
 from typing import Optional, Union, Literal
 from itertools import product
+from dataclasses import replace
+from src.api import client
+from src.api.bases.IO import HTTPPool
+from src.api.vendors import figi as figi_vendor
 
 DIRECTORY = pd.DataFrame\
     .from_records(columns=['Name', 'Description', 'Type', 'API Endpoint', 'API Key'],
@@ -68,6 +73,22 @@ def figi(id_type: Optional[str] = None,
     return res
 
 
+async def figi_search(query: str, labels: bool = False, **kwargs) -> Union[pd.DataFrame, list[dict]]:
+    """Async counterpart of figi(query=...) for code already on the client's event loop; pages through the
+    client's shared HTTP pool, so its cache, tapes and connections apply
+
+    :param query: corresponds to query under POST /v3/search
+    :param labels: determines if DataFrame is returned (default: False)
+    :param kwargs: passed to API query body
+    :return: DataFrame or list of dicts depending upon labels argument
+    """
+    standard = DIRECTORY.loc['figi']
+    url = standard['API Endpoint'] + 'search'
+    headers = {'X-OPENFIGI-APIKEY': standard['API Key']}
+    res = await _figi_walk(client.http_pool(), url=url, headers=headers, query=query, **kwargs)
+    return pd.DataFrame.from_records(res) if labels else res
+
+
 def _get_records_json(standard: pd.Series, match_on, values, output):
     values = [None] if match_on is None else values
     values = [values] if not isinstance(values, list) else values
@@ -119,24 +140,21 @@ def _figi_search(url: str, headers: dict, query: str, **kwargs):
         body.update(**kwargs)
     dup = {'url': url, 'json': body, 'headers': headers}
 
-    def inner(rec: list, s: Optional[str], u, b, h):
-        if s:
-            body.update({'start': s})
-        request = requests.post(url=u, json=b, headers=h)
-        match request.status_code:
-            case 429:
-                print('Rate limit reached, sleeping 60s')
-                time.sleep(60)
-                return s
-            case 200:
-                rec.extend(request.json().get('data'))
-                print(f'Results = {len(rec)}')
-                return request.json().get('next')
-            case _:
-                raise requests.exceptions.HTTPError(request.status_code)
-
-    start = inner(records := [], None, url, body, headers)
-    while start:
-        start = inner(records, start, url, body, headers)
+    # scripts only: asyncio.run cannot nest inside a running loop, where figi_search is the way in
+    async def inner() -> list:
+        pool = HTTPPool()
+        try:
+            return await _figi_walk(pool, url=url, headers=headers, query=query, **kwargs)
+        finally:
+            await pool.close()
 
+    records = asyncio.run(inner())
     return records, dup
+
+
+async def _figi_walk(pool: HTTPPool, url: str, headers: dict, query: str, **kwargs) -> list:
+    # the vendor's search endpoint owns the cursor paging; only the url and key come from DIRECTORY.
+    # the next cursor's page is already in flight while this one is unpacked; 429s are waited out
+    search = figi_vendor.get_search(query, kwargs)
+    request = replace(search.request, url=url, headers=headers)
+    return [rec async for _, _, res in search.paginator.walk(pool, request) for rec in res.json().get('data', ())]
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from pandas import Timestamp
+from src.api.bases import Spool
+from src.api.bases.Data import Data, Field
+from src.api.bases.IO import Result
+
+
+async def _db_script(pool, requests):
+    # stands in for a database where the 'poison' table was never created
+    for request in requests:
+        if 'poison' in repr(request.body):
+            raise RuntimeError('relation "test.poison" does not exist')
+        pool.append(request)
+
+
+async def _db_transaction(pool, request):
+    # no registered partitioned tables
+    return Result(Data(fields=request.returns, records=()))
+
+
+def _segment(spool: Spool.Spool, table: str, value: int):
+    spool.append('test', table, Data(fields=(Field('x', int),), records=((value,),)))
+    spool.roll()
+
+
+def test_drain_quarantines_poisoned_segment(tmp_path, monkeypatch):
+    monkeypatch.setattr(Spool, 'db_script', _db_script)
+    monkeypatch.setattr(Spool, 'db_transaction', _db_transaction)
+    spool = Spool.Spool(root=tmp_path)
+    _segment(spool, 'good', 1)
+    _segment(spool, 'poison', 2)
+    poisoned = spool.sealed()[-1]
+    _segment(spool, 'good', 3)
+    written = []
+
+    # the bad segment holds back the ones behind it until it has failed MAX_ATTEMPTS times
+    for _ in range(Spool.MAX_ATTEMPTS - 1):
+        with pytest.raises(RuntimeError):
+            asyncio.run(Spool.drain(spool, written))
+    assert len(written) == 1 and len(spool.sealed()) == 2
+
+    assert asyncio.run(Spool.drain(spool, written)) == 1
+    assert len(written) == 2
+    assert spool.sealed() == []
+    assert (tmp_path / Spool.QUARANTINE / poisoned.name).exists()
+    spool.close()
+
+
+def test_vendor_rows_precede_coverage_and_watermarks():
+    mark = Timestamp('2024-01-02')
+    batch = Spool.Batch(
+        'fred', 'series', None, Data(fields=(Field('x', int),), records=((1,),)),
+        coverage=(('fred', 'GDP', 'series', Timestamp('2024-01-01'), mark),),
+        watermarks=(('daily', 'fred', 'series', 'GDP', mark),))
+    bodies = [repr(request.body) for request in Spool._requests([batch])]
+    register = next(i for i, body in enumerate(bodies) if '_meta.vendors' in body)
+    assert all(i > register for i, body in enumerate(bodies) if '_meta.coverage' in body or '_meta.watermarks' in body)
+
+
+def test_batch_round_trips_time_zones():
+    aware, naive = Timestamp('2024-05-15 09:30', tz='America/New_York'), Timestamp('2024-05-15 09:30')
+    batch = Spool.Batch(
+        'td', 'quote', ('symbol',), Data(fields=(Field('symbol', str), Field('t', Timestamp)),
+                                         records=(('A', aware), ('B', naive), ('C', None))),
+        coverage=(('td', 'A', 't', aware, naive),),
+        watermarks=(('daily', 'td', 'quote', 'A', aware),))
+    decoded = Spool.Batch.decode(batch.encode())
+    assert decoded.data.records == batch.data.records
+    assert str(decoded.data.records[0][1].tz) == 'America/New_York'
+    assert decoded.data.records[1][1].tz is None
+    assert decoded.coverage == batch.coverage and decoded.watermarks == batch.watermarks
+    assert decoded.coverage[0][3].tz is not None and decoded.coverage[0][4].tz is None
+
+
+def test_partitions_precede_rows_that_need_them():
+    rows = ((Timestamp('2024-01-31 23:00'), 1.0), (Timestamp('2024-03-01'), 2.0), (None, 3.0))
+    batch = Spool.Batch('td', 'bars', None, Data(fields=(Field('t', Timestamp), Field('close', float)), records=rows))
+    bodies = [repr(request.body) for request in Spool._requests([batch], {('td', 'bars'): ('t', 'month')})]
+    created = [i for i, body in enumerate(bodies) if 'PARTITION OF' in body]
+    assert len(created) == 3  # January through March, whose only row sits exactly on its lower edge
+    assert all('bars_p2024' in bodies[i] for i in created)
+    assert max(created) < next(i for i, body in enumerate(bodies) if 'COPY' in body)